@@ -1,73 +1,74 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import numpy as np
-from moviepy.editor import *
-from gtts import gTTS
-import tempfile
 
-def create_mountain_majesty_background(duration, size=(1080, 1920)):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from background_cache import cached_background, loop_period
+from overlay_cache import overlay_cache
+from overlay_compositor import composite_overlays
+from palettes import ThresholdPalette
+from parallel_export import default_render_workers, write_videofile_parallel
+from render_output import write_videofile_muxed
+from sprites import SpriteLayer, style_variant
+from text_raster import check_fonts, text_clip
+from theme_layers import InPlaceBackground, saturating_add
+from tts_cache import synthesize_speech, tts_cache
+
+MOUNTAIN_SKY_PALETTE = ThresholdPalette([
+    (0.4, lambda gradient: (                           # Upper sky - deep purple/blue
+        (80 + 40 * gradient).astype(np.int64),         # Purple to blue
+        (60 + 80 * gradient).astype(np.int64),         # Growing lighter
+        (120 + 100 * gradient).astype(np.int64),       # Blue base
+    )),
+    (None, lambda gradient: (                          # Lower sky - golden sunrise
+        (220 + 35 * ((gradient - 0.4) / 0.6)).astype(np.int64),  # Golden red
+        (140 + 80 * ((gradient - 0.4) / 0.6)).astype(np.int64),  # Golden yellow
+        (60 + 40 * ((gradient - 0.4) / 0.6)).astype(np.int64),   # Warm undertones
+    )),
+])
+
+def create_mountain_majesty_background(duration, size=(1080, 1920), fps=24):
     """Create mountain silhouettes with divine light for strength/perseverance theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Sky gradient from purple to gold
-        for y in range(size[1]):
-            gradient = y / size[1]
-            
-            if gradient < 0.4:  # Upper sky - deep purple/blue
-                sky_color = [
-                    int(80 + 40 * gradient),   # Purple to blue
-                    int(60 + 80 * gradient),   # Growing lighter
-                    int(120 + 100 * gradient)  # Blue base
-                ]
-            else:  # Lower sky - golden sunrise
-                transition = (gradient - 0.4) / 0.6
-                sky_color = [
-                    int(220 + 35 * transition), # Golden red
-                    int(140 + 80 * transition), # Golden yellow
-                    int(60 + 40 * transition)   # Warm undertones
-                ]
-            
-            img[y, :] = sky_color
+    # Sky gradient from purple to gold (static, one colour per row)
+    gradient = np.arange(size[1]) / size[1]
+    sky_column = MOUNTAIN_SKY_PALETTE.evaluate(MOUNTAIN_SKY_PALETTE.band_index(gradient), gradient)
+    
+    # Coordinate grids shared by every frame
+    xs = np.arange(size[0])
+    ys = np.arange(size[1])[:, np.newaxis]
+    mountain_height = size[1] // 3
+    
+    # Light rays widen by one pixel every 50 rows down from the top
+    ray_rows = size[1] // 2
+    ray_half_width = np.maximum(1, np.arange(ray_rows) // 50)[:, np.newaxis]
+    ray_reach = int(ray_half_width.max())
+    
+    def render_frame(img, t):
+        img[:] = sky_column[:, np.newaxis, :]
         
-        # Mountain silhouettes
-        mountain_height = size[1] // 3
-        for x in range(size[0]):
-            # Multiple mountain layers with movement
-            mountain1 = int(mountain_height * (0.8 + 0.2 * np.sin(x / 100 + t * 0.2)))
-            mountain2 = int(mountain_height * (0.6 + 0.3 * np.sin(x / 80 + t * 0.15)))
-            
-            # Draw mountain silhouettes
-            max_mountain = max(mountain1, mountain2)
-            for y in range(size[1] - max_mountain, size[1]):
-                img[y, x] = [40, 40, 60]  # Dark mountain silhouette
+        # Mountain silhouettes: two moving height maps against the y grid
+        mountain1 = (mountain_height * (0.8 + 0.2 * np.sin(xs / 100 + t * 0.2))).astype(np.int64)
+        mountain2 = (mountain_height * (0.6 + 0.3 * np.sin(xs / 80 + t * 0.15))).astype(np.int64)
+        img[ys >= size[1] - np.maximum(mountain1, mountain2)] = [40, 40, 60]
         
-        # Divine light rays from peak
+        # Divine light rays from peak, each touching only its own columns
         for i in range(5):
             ray_x = size[0] // 2 + int(100 * np.sin(t * 0.3 + i))
             ray_intensity = int(100 * (0.5 + 0.5 * np.sin(t * 2 + i)))
             
-            for y in range(0, size[1] // 2):
-                ray_width = max(1, y // 50)
-                for dx in range(-ray_width, ray_width + 1):
-                    if 0 <= ray_x + dx < size[0]:
-                        img[y, ray_x + dx] = [
-                            min(255, img[y, ray_x + dx, 0] + ray_intensity),
-                            min(255, img[y, ray_x + dx, 1] + ray_intensity),
-                            min(255, img[y, ray_x + dx, 2] + ray_intensity // 2)
-                        ]
-        
-        return img
+            x0, x1 = max(0, ray_x - ray_reach), min(size[0], ray_x + ray_reach + 1)
+            in_ray = np.abs(xs[x0:x1] - ray_x)[np.newaxis, :] <= ray_half_width
+            ray_color = np.array([ray_intensity, ray_intensity, ray_intensity // 2], dtype=np.uint8)
+            saturating_add(img[:ray_rows, x0:x1], in_ray[:, :, np.newaxis] * ray_color)
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('mountain_majesty', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.2, 0.15, 0.3, 2))
 
-def create_flowing_river_background(duration, size=(1080, 1920)):
+def create_flowing_river_background(duration, size=(1080, 1920), fps=24):
     """Create flowing river for life/renewal theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
+    def render_frame(img, t):
         # Riverbank scene
         for y in range(size[1]):
             if y < size[1] // 3:  # Sky
@@ -94,16 +95,12 @@ def create_flowing_river_background(duration, size=(1080, 1920)):
                             min(255, img[y, flow_x, 1] + brightness),
                             min(255, img[y, flow_x, 2] + brightness)
                         ]
-        
-        return img
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('flowing_river', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.5, 0.3, 1.5, 2, 3))
 
-def create_wheat_field_background(duration, size=(1080, 1920)):
+def create_wheat_field_background(duration, size=(1080, 1920), fps=24):
     """Create golden wheat field for harvest/blessing theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
+    def render_frame(img, t):
         # Sky with warm light
         for y in range(size[1] // 2):
             sky_intensity = int(200 + 40 * (1 - y / (size[1] // 2)))
@@ -134,16 +131,21 @@ def create_wheat_field_background(duration, size=(1080, 1920)):
                 for y in range(size[1] // 2, size[1]):
                     if y % 10 == 0:  # Wheat head
                         img[y, stalk_x] = [255, 200, 100]
-        
-        return img
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('wheat_field', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(1.5, 0.8, 2))
+
+SHEPHERD_CLOUD_STAMP = np.fromfunction(
+    lambda dy, dx: np.where((dx - 40)**2 + (dy - 20)**2 < 600,
+                            0.3 * (1 - ((dx - 40)**2 + (dy - 20)**2) / 600), 0.0),
+    (41, 81)
+)
 
-def create_shepherd_field_background(duration, size=(1080, 1920)):
+def create_shepherd_field_background(duration, size=(1080, 1920), fps=24):
     """Create pastoral field for shepherd/guidance theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
+    cloud_index = np.arange(3)
+    clouds = SpriteLayer(SHEPHERD_CLOUD_STAMP, size)
+    
+    def render_frame(img, t):
         # Soft pastoral sky
         for y in range(size[1] // 2):
             soft_blue = int(160 + 60 * (1 - y / (size[1] // 2)))
@@ -176,137 +178,109 @@ def create_shepherd_field_background(duration, size=(1080, 1920)):
                         img[y, grass_x] = [60, 140, 70]  # Grass blades
         
         # Soft clouds
-        for i in range(3):
-            cloud_x = int(size[0] * (0.2 + 0.3 * i) + 30 * np.sin(t * 0.2 + i))
-            cloud_y = int(size[1] * 0.2 + 20 * np.sin(t * 0.3 + i))
-            
-            # Draw soft cloud
-            for dy in range(-20, 21):
-                for dx in range(-40, 41):
-                    if (0 <= cloud_x + dx < size[0] and 0 <= cloud_y + dy < size[1] and
-                        dx*dx + dy*dy < 600):
-                        cloud_alpha = 0.3 * (1 - (dx*dx + dy*dy) / 600)
-                        cloud_white = int(255 * cloud_alpha)
-                        img[cloud_y + dy, cloud_x + dx] = [
-                            min(255, img[cloud_y + dy, cloud_x + dx, 0] + cloud_white),
-                            min(255, img[cloud_y + dy, cloud_x + dx, 1] + cloud_white),
-                            min(255, img[cloud_y + dy, cloud_x + dx, 2] + cloud_white)
-                        ]
-        
-        return img
+        cloud_x = (size[0] * (0.2 + 0.3 * cloud_index) + 30 * np.sin(t * 0.2 + cloud_index)).astype(np.int64)
+        cloud_y = (size[1] * 0.2 + 20 * np.sin(t * 0.3 + cloud_index)).astype(np.int64)
+        clouds.add(img, np.stack([cloud_x, cloud_y], axis=1), 255)
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('shepherd_field', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.4, 0.3, 1.8, 0.2))
 
-def create_temple_light_background(duration, size=(1080, 1920)):
+def create_temple_light_background(duration, size=(1080, 1920), fps=24):
     """Create temple with divine light for worship/sanctuary theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
+    rows = np.arange(size[1])
+    golden_base = (120 + 80 * (1 - rows / size[1])).astype(np.int64)
+    
+    # Temple pillars (simplified)
+    pillar_width = 40
+    pillar_positions = [size[0] // 4, 3 * size[0] // 4]
+    pillar_rows = rows[size[1] // 3:]
+    
+    # Divine light: 8 rays sampled every 5 pixels out from the centre
+    center_x, center_y = size[0] // 2, size[1] // 4
+    ray_angles = np.arange(0, 360, 45)
+    ray_radii = np.arange(0, 200, 5)
+    ray_fade = (200 - ray_radii) / 200
+    light_points = SpriteLayer(np.ones((1, 1)), size)
+    
+    def render_frame(img, t):
         # Sacred golden background
-        for y in range(size[1]):
-            golden_base = int(120 + 80 * (1 - y / size[1]))
-            sacred_glow = int(40 * np.sin(t * 1.5 + y / 100))
-            
-            temple_color = [
-                min(255, golden_base + sacred_glow),
-                int((golden_base + sacred_glow) * 0.8),
-                int((golden_base + sacred_glow) * 0.4)
-            ]
-            
-            img[y, :] = temple_color
+        sacred_glow = (40 * np.sin(t * 1.5 + rows / 100)).astype(np.int64)
+        temple_base = golden_base + sacred_glow
+        temple_column = np.stack([
+            np.minimum(255, temple_base),
+            (temple_base * 0.8).astype(np.int64),
+            (temple_base * 0.4).astype(np.int64)
+        ], axis=1)
         
-        # Temple pillars (simplified)
-        pillar_width = 40
-        pillar_positions = [size[0] // 4, 3 * size[0] // 4]
+        img[:] = temple_column[:, np.newaxis, :]
         
+        # Marble-like pillar color
+        pillar_brightness = (200 + 30 * np.sin(pillar_rows / 50 + t * 0.5)).astype(np.int64)
+        pillar_column = np.stack([
+            pillar_brightness,
+            pillar_brightness,
+            (pillar_brightness * 0.95).astype(np.int64)
+        ], axis=1)
         for pillar_x in pillar_positions:
-            for y in range(size[1] // 3, size[1]):
-                for x in range(pillar_x - pillar_width//2, pillar_x + pillar_width//2):
-                    if 0 <= x < size[0]:
-                        # Marble-like pillar color
-                        pillar_brightness = int(200 + 30 * np.sin(y / 50 + t * 0.5))
-                        img[y, x] = [pillar_brightness, pillar_brightness, int(pillar_brightness * 0.95)]
+            x0 = max(0, pillar_x - pillar_width//2)
+            img[size[1] // 3:, x0:pillar_x + pillar_width//2] = pillar_column[:, np.newaxis, :]
         
-        # Divine light emanating from center
-        center_x, center_y = size[0] // 2, size[1] // 4
+        # Polar sample grid: angle per ray, radius per sample
+        rad = np.radians(ray_angles + t * 30)[:, np.newaxis]
+        light_x = (center_x + ray_radii * np.cos(rad)).astype(np.int64)
+        light_y = (center_y + ray_radii * np.sin(rad)).astype(np.int64)
+        light_intensity = (100 * (0.7 + 0.3 * np.sin(t * 3 + ray_angles))).astype(np.int64)
+        glow = (light_intensity[:, np.newaxis] * ray_fade).astype(np.int64)
         
-        for angle in range(0, 360, 45):
-            rad = np.radians(angle + t * 30)
-            light_intensity = int(100 * (0.7 + 0.3 * np.sin(t * 3 + angle)))
-            
-            for r in range(0, 200, 5):
-                light_x = int(center_x + r * np.cos(rad))
-                light_y = int(center_y + r * np.sin(rad))
-                
-                if 0 <= light_x < size[0] and 0 <= light_y < size[1]:
-                    fade = (200 - r) / 200
-                    glow = int(light_intensity * fade)
-                    img[light_y, light_x] = [
-                        min(255, img[light_y, light_x, 0] + glow),
-                        min(255, img[light_y, light_x, 1] + glow),
-                        min(255, img[light_y, light_x, 2] + glow//2)
-                    ]
-        
-        return img
+        light_points.add(img, np.stack([light_x.ravel(), light_y.ravel()], axis=1),
+                         glow.ravel(), color=(1.0, 1.0, 0.5))
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('temple_light', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(1.5, 0.5, np.radians(30), 3))
 
-def create_city_lights_background(duration, size=(1080, 1920)):
+def create_city_lights_background(duration, size=(1080, 1920), fps=24, seed=0):
     """Create city skyline for mission/evangelism theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Evening sky gradient
-        for y in range(size[1]):
-            if y < size[1] // 2:  # Upper sky
-                evening_blue = int(40 + 60 * (y / (size[1] // 2)))
-                img[y, :] = [int(evening_blue * 0.8), int(evening_blue * 0.9), evening_blue]
-            else:  # Lower sky with city glow
-                city_glow = int(80 + 40 * ((y - size[1] // 2) / (size[1] // 2)))
-                img[y, :] = [city_glow, int(city_glow * 0.7), int(city_glow * 0.4)]
-        
-        # City building silhouettes
-        building_heights = [300, 250, 400, 180, 350, 220, 380]
-        building_width = size[0] // len(building_heights)
-        
-        for i, height in enumerate(building_heights):
-            building_x = i * building_width
-            building_height = int(height + 50 * np.sin(t * 0.5 + i))
-            
-            for y in range(size[1] - building_height, size[1]):
-                for x in range(building_x, building_x + building_width - 5):
-                    if 0 <= x < size[0]:
-                        img[y, x] = [20, 20, 40]  # Dark building silhouette
+    half_height = size[1] // 2
+    rows = np.arange(size[1])
+    
+    # Evening sky gradient: upper sky, then lower sky with city glow
+    evening_blue = (40 + 60 * (rows / half_height)).astype(np.int64)
+    city_glow = (80 + 40 * ((rows - half_height) / half_height)).astype(np.int64)
+    sky_column = np.where(
+        (rows < half_height)[:, np.newaxis],
+        np.stack([(evening_blue * 0.8).astype(np.int64), (evening_blue * 0.9).astype(np.int64), evening_blue], axis=1),
+        np.stack([city_glow, (city_glow * 0.7).astype(np.int64), (city_glow * 0.4).astype(np.int64)], axis=1)
+    ).astype(np.uint8)
+    
+    # City building silhouettes
+    building_heights = [300, 250, 400, 180, 350, 220, 380]
+    building_width = size[0] // len(building_heights)
+    
+    # Every window a building can ever show; which ones are lit is fixed per video
+    windows = np.array([
+        (i, floor, i * building_width + window)
+        for i, height in enumerate(building_heights)
+        for floor in range(10, height + 50, 30)
+        for window in range(10, building_width - 10, 20)
+    ])
+    window_building, window_floor, window_x = windows.T
+    window_positions = np.stack([window_x, size[1] - window_floor], axis=1)
+    window_lit = np.random.RandomState(seed).random_sample(len(windows)) > 0.3
+    window_lights = SpriteLayer(np.ones((5, 7)), size, anchor_inside=True)
+    
+    def render_frame(img, t):
+        img[:] = sky_column[:, np.newaxis, :]
         
-        # Building lights (windows)
-        for i in range(len(building_heights)):
+        current_heights = [int(height + 50 * np.sin(t * 0.5 + i))
+                           for i, height in enumerate(building_heights)]
+        for i, building_height in enumerate(current_heights):
             building_x = i * building_width
-            building_height = int(building_heights[i] + 50 * np.sin(t * 0.5 + i))
-            
-            # Add window lights
-            for floor in range(10, building_height, 30):
-                for window in range(10, building_width - 10, 20):
-                    window_x = building_x + window
-                    window_y = size[1] - floor
-                    
-                    if (0 <= window_x < size[0] and 0 <= window_y < size[1] and
-                        np.random.random() > 0.3):  # Random window lights
-                        light_intensity = int(200 * (0.7 + 0.3 * np.sin(t * 4 + i + floor)))
-                        
-                        # Small window light
-                        for dy in range(-2, 3):
-                            for dx in range(-3, 4):
-                                if (0 <= window_x + dx < size[0] and 
-                                    0 <= window_y + dy < size[1]):
-                                    img[window_y + dy, window_x + dx] = [
-                                        light_intensity, 
-                                        int(light_intensity * 0.9), 
-                                        int(light_intensity * 0.6)
-                                    ]
+            img[max(0, size[1] - building_height):, building_x:building_x + building_width - 5] = [20, 20, 40]
         
-        return img
+        # Building lights (windows) on the floors each building currently has
+        visible = window_lit & (window_floor < np.array(current_heights)[window_building])
+        light_intensity = (200 * (0.7 + 0.3 * np.sin(t * 4 + window_building + window_floor))).astype(np.int64)
+        window_lights.paint(img, window_positions[visible], light_intensity[visible], color=(1.0, 0.9, 0.6))
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background(f'city_lights_{seed}', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.5, 4))
 
 def create_themed_video(theme_config, output_dir="storage/backup_themes"):
     """Create a single themed video and save locally"""
@@ -322,13 +296,10 @@ def create_themed_video(theme_config, output_dir="storage/backup_themes"):
     
     # Generate Korean TTS
     print("🎤 Generating Korean audio...")
-    tts = gTTS(text=korean_script, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as audio_file:
-        tts.save(audio_file.name)
-        audio = AudioFileClip(audio_file.name)
-        duration = audio.duration
-        print(f"   Audio duration: {duration:.1f} seconds")
+    speech = synthesize_speech(korean_script, lang='ko', slow=False)
+    duration = speech.duration
+    print(f"   Audio duration: {duration:.1f} seconds "
+          f"({'TTS cache hit' if speech.cached else 'synthesized'})")
     
     # Create theme-specific background
     print(f"🎨 Creating {theme_name} background...")
@@ -341,12 +312,16 @@ def create_themed_video(theme_config, output_dir="storage/backup_themes"):
         "city_lights": create_city_lights_background
     }
     
-    background = background_functions[theme_name](duration)
+    if theme_name == "city_lights":
+        # Lit windows come from one of a few cached variants, chosen per video
+        background = create_city_lights_background(duration, seed=style_variant(theme_name, korean_script))
+    else:
+        background = background_functions[theme_name](duration)
     
     # Add text overlays
     print("📝 Adding text overlay...")
     
-    title_clip = TextClip(
+    title_clip = text_clip(
         theme_config['title_text'],
         fontsize=54,
         color='white',
@@ -355,7 +330,7 @@ def create_themed_video(theme_config, output_dir="storage/backup_themes"):
         stroke_width=3
     ).set_position(('center', 280)).set_duration(duration)
     
-    subtitle_clip = TextClip(
+    subtitle_clip = text_clip(
         theme_config['subtitle_text'],
         fontsize=36,
         color=theme_config.get('subtitle_color', 'lightyellow'),
@@ -366,31 +341,40 @@ def create_themed_video(theme_config, output_dir="storage/backup_themes"):
     
     # Compose final video
     print("🎬 Composing final video...")
-    final_video = CompositeVideoClip([
+    final_video = composite_overlays([
         background,
         title_clip,
         subtitle_clip
-    ]).set_audio(audio)
+    ])
     
     # Export video to backup directory
     output_file = os.path.join(output_dir, f"backup_{theme_name}.mp4")
     print(f"💾 Exporting to {output_file}...")
     
-    final_video.write_videofile(
-        output_file,
-        fps=24,
-        codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None
-    )
+    render_workers = theme_config.get('render_workers', default_render_workers())
+    if render_workers > 1:
+        write_videofile_parallel(
+            final_video,
+            output_file,
+            fps=24,
+            workers=render_workers,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac'
+        )
+    else:
+        write_videofile_muxed(
+            final_video,
+            output_file,
+            fps=24,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac'
+        )
     
     # Cleanup
     final_video.close()
-    audio.close()
-    os.unlink(audio_file.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     print(f"✅ Video saved locally: {file_size:.1f}MB")
@@ -495,6 +479,8 @@ def main():
     print(f"\n{'='*60}")
     print("🎉 ALL 6 BACKUP THEMES CREATED!")
     print(f"{'='*60}")
+    overlay_cache().print_stats()
+    tts_cache().print_stats()
     
     print("\n📁 BACKUP VIDEOS SAVED LOCALLY:")
     for i, video in enumerate(created_videos):
@@ -525,4 +511,5 @@ def main():
     print("\n   = 10 TOTAL UNIQUE SPIRITUAL THEMES! 🎉")
 
 if __name__ == "__main__":
+    check_fonts()  # fail before synthesizing any audio
     main()
\ No newline at end of file
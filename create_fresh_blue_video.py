@@ -1,45 +1,41 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import requests
 import numpy as np
 from moviepy.editor import *
-from gtts import gTTS
-import tempfile
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from overlay_compositor import composite_overlays
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from theme_layers import RowConstantBackground
+from tts_cache import synthesize_speech
+
 def create_peaceful_blue_background(duration, size=(1080, 1920)):
     """Create a peaceful blue flowing background"""
-    def make_frame(t):
-        # Create base blue gradient
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Create flowing blue patterns
-        for y in range(size[1]):
-            # Base blue intensity
-            base_intensity = int(180 + 50 * np.sin(y / size[1] * 2 * np.pi))
-            
-            # Add flowing wave effect
-            wave_offset = int(20 * np.sin(t * 0.3 + y / 100))
-            
-            # Peaceful blue color palette
-            blue_intensity = min(255, base_intensity + wave_offset)
-            peaceful_blue = [
-                int(blue_intensity * 0.2),  # Low red
-                int(blue_intensity * 0.4),  # Medium green  
-                blue_intensity               # High blue
-            ]
-            
-            img[y, :] = peaceful_blue
-            
-        # Add gentle horizontal flow
-        flow = int(15 * np.sin(t * 0.5))
-        img = np.roll(img, flow, axis=1)
-        
-        return img
+    rows = np.arange(size[1])
+    
+    # Base blue intensity
+    base_intensity = (180 + 50 * np.sin(rows / size[1] * 2 * np.pi)).astype(np.int64)
     
-    return VideoClip(make_frame, duration=duration)
+    def peaceful_column(t):
+        # Add flowing wave effect
+        wave_offset = (20 * np.sin(t * 0.3 + rows / 100)).astype(np.int64)
+        
+        # Peaceful blue color palette
+        blue_intensity = np.minimum(255, base_intensity + wave_offset)
+        return np.stack([
+            (blue_intensity * 0.2).astype(np.int64),  # Low red
+            (blue_intensity * 0.4).astype(np.int64),  # Medium green
+            blue_intensity                            # High blue
+        ], axis=1)
+    
+    # Rows are uniform, so the old horizontal np.roll flow never moved a pixel
+    return VideoClip(RowConstantBackground(peaceful_column, size).make_frame, duration=duration)
 
 def create_fresh_blue_video():
     print("🕯️ CREATING FRESH PEACEFUL BLUE VIDEO")
@@ -55,13 +51,10 @@ def create_fresh_blue_video():
     
     # Generate Korean TTS
     print("🎤 Generating Korean audio...")
-    tts = gTTS(text=korean_script, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as audio_file:
-        tts.save(audio_file.name)
-        audio = AudioFileClip(audio_file.name)
-        duration = audio.duration
-        print(f"   Audio duration: {duration:.1f} seconds")
+    speech = synthesize_speech(korean_script, lang='ko', slow=False)
+    duration = speech.duration
+    print(f"   Audio duration: {duration:.1f} seconds "
+          f"({'TTS cache hit' if speech.cached else 'synthesized'})")
     
     # Create peaceful blue background
     print("🎨 Creating peaceful blue background...")
@@ -72,7 +65,7 @@ def create_fresh_blue_video():
     title_text = "진리의 말씀\n평안한 기도시간"
     subtitle_text = "묵상과 기도"
     
-    title_clip = TextClip(
+    title_clip = text_clip(
         title_text,
         fontsize=60,
         color='white',
@@ -81,7 +74,7 @@ def create_fresh_blue_video():
         stroke_width=2
     ).set_position(('center', 300)).set_duration(duration)
     
-    subtitle_clip = TextClip(
+    subtitle_clip = text_clip(
         subtitle_text,
         fontsize=40,
         color='lightblue',
@@ -92,31 +85,28 @@ def create_fresh_blue_video():
     
     # Compose final video
     print("🎬 Composing final video...")
-    final_video = CompositeVideoClip([
+    final_video = composite_overlays([
         background,
         title_clip,
         subtitle_clip
-    ]).set_audio(audio)
+    ])
     
     # Export video
     output_file = "fresh_peaceful_blue.mp4"
     print(f"💾 Exporting to {output_file}...")
     
-    final_video.write_videofile(
+    write_videofile_muxed(
+        final_video,
         output_file,
         fps=24,
+        audio_file=speech.path,
         codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None
+        audio_codec='aac'
     )
     
     # Cleanup
     final_video.close()
-    audio.close()
-    os.unlink(audio_file.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     print(f"✅ Video created: {file_size:.1f}MB")
@@ -217,4 +207,5 @@ def main():
         os.remove(video_file)
 
 if __name__ == "__main__":
+    check_fonts()  # fail before synthesizing any audio
     main()
\ No newline at end of file
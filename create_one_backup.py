@@ -1,67 +1,15 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
-import numpy as np
-from moviepy.editor import *
-from gtts import gTTS
-import tempfile
 
-def create_mountain_majesty_background(duration, size=(1080, 1920)):
-    """Create mountain silhouettes with divine light for strength/perseverance theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Sky gradient from purple to gold
-        for y in range(size[1]):
-            gradient = y / size[1]
-            
-            if gradient < 0.4:  # Upper sky - deep purple/blue
-                sky_color = [
-                    int(80 + 40 * gradient),   # Purple to blue
-                    int(60 + 80 * gradient),   # Growing lighter
-                    int(120 + 100 * gradient)  # Blue base
-                ]
-            else:  # Lower sky - golden sunrise
-                transition = (gradient - 0.4) / 0.6
-                sky_color = [
-                    int(220 + 35 * transition), # Golden red
-                    int(140 + 80 * transition), # Golden yellow
-                    int(60 + 40 * transition)   # Warm undertones
-                ]
-            
-            img[y, :] = sky_color
-        
-        # Mountain silhouettes
-        mountain_height = size[1] // 3
-        for x in range(size[0]):
-            # Multiple mountain layers with movement
-            mountain1 = int(mountain_height * (0.8 + 0.2 * np.sin(x / 100 + t * 0.2)))
-            mountain2 = int(mountain_height * (0.6 + 0.3 * np.sin(x / 80 + t * 0.15)))
-            
-            # Draw mountain silhouettes
-            max_mountain = max(mountain1, mountain2)
-            for y in range(size[1] - max_mountain, size[1]):
-                img[y, x] = [40, 40, 60]  # Dark mountain silhouette
-        
-        # Divine light rays from peak
-        for i in range(5):
-            ray_x = size[0] // 2 + int(100 * np.sin(t * 0.3 + i))
-            ray_intensity = int(100 * (0.5 + 0.5 * np.sin(t * 2 + i)))
-            
-            for y in range(0, size[1] // 2):
-                ray_width = max(1, y // 50)
-                for dx in range(-ray_width, ray_width + 1):
-                    if 0 <= ray_x + dx < size[0]:
-                        img[y, ray_x + dx] = [
-                            min(255, img[y, ray_x + dx, 0] + ray_intensity),
-                            min(255, img[y, ray_x + dx, 1] + ray_intensity),
-                            min(255, img[y, ray_x + dx, 2] + ray_intensity // 2)
-                        ]
-        
-        return img
-    
-    return VideoClip(make_frame, duration=duration)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from create_backup_themes import create_mountain_majesty_background
+from overlay_compositor import composite_overlays
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from tts_cache import synthesize_speech
 
 def create_mountain_majesty_video():
     print("⛰️ CREATING MOUNTAIN MAJESTY THEME - BACKUP 1/6")
@@ -76,13 +24,10 @@ def create_mountain_majesty_video():
     
     # Generate Korean TTS
     print("🎤 Generating Korean audio...")
-    tts = gTTS(text=korean_script, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as audio_file:
-        tts.save(audio_file.name)
-        audio = AudioFileClip(audio_file.name)
-        duration = audio.duration
-        print(f"   Audio duration: {duration:.1f} seconds")
+    speech = synthesize_speech(korean_script, lang='ko', slow=False)
+    duration = speech.duration
+    print(f"   Audio duration: {duration:.1f} seconds "
+          f"({'TTS cache hit' if speech.cached else 'synthesized'})")
     
     # Create mountain background
     print("🎨 Creating mountain majesty background...")
@@ -91,7 +36,7 @@ def create_mountain_majesty_video():
     # Add text overlays
     print("📝 Adding text overlay...")
     
-    title_clip = TextClip(
+    title_clip = text_clip(
         "진리의 말씀\n산의 위엄",
         fontsize=54,
         color='white',
@@ -100,7 +45,7 @@ def create_mountain_majesty_video():
         stroke_width=3
     ).set_position(('center', 280)).set_duration(duration)
     
-    subtitle_clip = TextClip(
+    subtitle_clip = text_clip(
         "힘과 인내",
         fontsize=36,
         color='lightsteelblue',
@@ -111,31 +56,28 @@ def create_mountain_majesty_video():
     
     # Compose final video
     print("🎬 Composing final video...")
-    final_video = CompositeVideoClip([
+    final_video = composite_overlays([
         background,
         title_clip,
         subtitle_clip
-    ]).set_audio(audio)
+    ])
     
     # Export video to backup directory
     output_file = "storage/backup_themes/backup_mountain_majesty.mp4"
     print(f"💾 Exporting to {output_file}...")
     
-    final_video.write_videofile(
+    write_videofile_muxed(
+        final_video,
         output_file,
         fps=24,
+        audio_file=speech.path,
         codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None
+        audio_codec='aac'
     )
     
     # Cleanup
     final_video.close()
-    audio.close()
-    os.unlink(audio_file.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     print(f"✅ Mountain Majesty saved: {file_size:.1f}MB")
@@ -160,4 +102,5 @@ def create_mountain_majesty_video():
     return output_file
 
 if __name__ == "__main__":
+    check_fonts()  # fail before synthesizing any audio
     create_mountain_majesty_video()
\ No newline at end of file
@@ -1,52 +1,48 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import requests
 import numpy as np
-from moviepy.editor import *
-from gtts import gTTS
-import tempfile
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-def create_sunset_worship_background(duration, size=(1080, 1920)):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from background_cache import cached_background, loop_period
+from parallel_export import default_render_workers, write_videofile_parallel
+from overlay_compositor import composite_overlays
+from palettes import ThresholdPalette
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from theme_layers import InPlaceBackground, RowConstantBackground
+from tts_cache import synthesize_speech
+
+# Sunset colour transition, shaded by a gentle wave
+SUNSET_PALETTE = ThresholdPalette([
+    (0.3, lambda wave: (255 + wave, 200 + wave // 2, 100 + wave // 3)),  # Top - warm yellow/orange
+    (0.6, lambda wave: (255 + wave, 120 + wave // 2, 60 + wave // 3)),   # Middle - sunset orange
+    (None, lambda wave: (120 + wave, 60 + wave // 2, 140 + wave // 3)),  # Bottom - evening purple
+])
+
+def create_sunset_worship_background(duration, size=(1080, 1920), fps=24):
     """Create warm sunset colors for evening devotion"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        for y in range(size[1]):
-            # Create sunset gradient from warm orange to deep purple
-            gradient_position = y / size[1]
-            
-            # Sunset color transition
-            if gradient_position < 0.3:  # Top - warm yellow/orange
-                base_color = [255, 200, 100]  # Warm yellow
-            elif gradient_position < 0.6:  # Middle - orange/red
-                base_color = [255, 120, 60]   # Sunset orange
-            else:  # Bottom - deep purple/blue
-                base_color = [120, 60, 140]   # Evening purple
-            
-            # Add gentle wave movement
-            wave = int(25 * np.sin(t * 0.4 + y / 80))
-            
-            # Apply color with wave effect
-            final_color = [
-                min(255, max(0, base_color[0] + wave)),
-                min(255, max(0, base_color[1] + wave // 2)),
-                min(255, max(0, base_color[2] + wave // 3))
-            ]
-            
-            img[y, :] = final_color
-            
-        return img
+    # Create sunset gradient from warm orange to deep purple
+    rows = np.arange(size[1])
+    sunset_bands = SUNSET_PALETTE.band_index(rows / size[1])
+    sunset_colours = SUNSET_PALETTE.lookup_table(-25, 25)
     
-    return VideoClip(make_frame, duration=duration)
+    def sunset_column(t):
+        # Add gentle wave movement
+        wave = (25 * np.sin(t * 0.4 + rows / 80)).astype(np.int64)
+        return sunset_colours(sunset_bands, wave)
+    
+    make_frame = RowConstantBackground(sunset_column, size).make_frame
+    
+    return cached_background('sunset_worship', make_frame, duration, size, fps, period=loop_period(0.4))
 
-def create_cross_pattern_background(duration, size=(1080, 1920)):
+def create_cross_pattern_background(duration, size=(1080, 1920), fps=24):
     """Create cross pattern with divine light"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
+    def render_frame(img, t):
         # Base golden background
         base_intensity = int(150 + 30 * np.sin(t * 0.5))
         base_color = [base_intensity, int(base_intensity * 0.8), int(base_intensity * 0.4)]
@@ -86,10 +82,8 @@ def create_cross_pattern_background(duration, size=(1080, 1920)):
                         min(255, img[i, j, 1] + glow),
                         min(255, img[i, j, 2] + glow // 2)
                     ]
-        
-        return img
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('cross_pattern', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.5, 2, 3))
 
 def create_themed_video(theme_name, korean_script, title_text, subtitle_text):
     print(f"🎨 CREATING {theme_name.upper()} THEME VIDEO")
@@ -99,13 +93,10 @@ def create_themed_video(theme_name, korean_script, title_text, subtitle_text):
     
     # Generate Korean TTS
     print("🎤 Generating Korean audio...")
-    tts = gTTS(text=korean_script, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as audio_file:
-        tts.save(audio_file.name)
-        audio = AudioFileClip(audio_file.name)
-        duration = audio.duration
-        print(f"   Audio duration: {duration:.1f} seconds")
+    speech = synthesize_speech(korean_script, lang='ko', slow=False)
+    duration = speech.duration
+    print(f"   Audio duration: {duration:.1f} seconds "
+          f"({'TTS cache hit' if speech.cached else 'synthesized'})")
     
     # Create theme-specific background
     print(f"🎨 Creating {theme_name} background...")
@@ -117,7 +108,7 @@ def create_themed_video(theme_name, korean_script, title_text, subtitle_text):
     # Add text overlays
     print("📝 Adding text overlay...")
     
-    title_clip = TextClip(
+    title_clip = text_clip(
         title_text,
         fontsize=60,
         color='white',
@@ -126,7 +117,7 @@ def create_themed_video(theme_name, korean_script, title_text, subtitle_text):
         stroke_width=3
     ).set_position(('center', 300)).set_duration(duration)
     
-    subtitle_clip = TextClip(
+    subtitle_clip = text_clip(
         subtitle_text,
         fontsize=40,
         color='lightyellow',
@@ -137,31 +128,40 @@ def create_themed_video(theme_name, korean_script, title_text, subtitle_text):
     
     # Compose final video
     print("🎬 Composing final video...")
-    final_video = CompositeVideoClip([
+    final_video = composite_overlays([
         background,
         title_clip,
         subtitle_clip
-    ]).set_audio(audio)
+    ])
     
     # Export video
     output_file = f"fresh_{theme_name}.mp4"
     print(f"💾 Exporting to {output_file}...")
     
-    final_video.write_videofile(
-        output_file,
-        fps=24,
-        codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None
-    )
+    render_workers = default_render_workers()
+    if render_workers > 1:
+        write_videofile_parallel(
+            final_video,
+            output_file,
+            fps=24,
+            workers=render_workers,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac'
+        )
+    else:
+        write_videofile_muxed(
+            final_video,
+            output_file,
+            fps=24,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac'
+        )
     
     # Cleanup
     final_video.close()
-    audio.close()
-    os.unlink(audio_file.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     print(f"✅ Video created: {file_size:.1f}MB")
@@ -309,4 +309,5 @@ def main():
     print("\n✨ Complete spiritual theme collection ready for invitees! 🚀")
 
 if __name__ == "__main__":
+    check_fonts()  # fail before synthesizing any audio
     main()
\ No newline at end of file
@@ -1,40 +1,17 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import requests
-import numpy as np
-from moviepy.editor import *
-from gtts import gTTS
-import tempfile
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-def create_ocean_waves_background(duration, size=(1080, 1920)):
-    """Create flowing ocean waves for baptism/renewal theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        for y in range(size[1]):
-            # Ocean blue gradient with waves
-            wave1 = int(30 * np.sin(t * 0.8 + y / 50))
-            wave2 = int(20 * np.sin(t * 1.2 + y / 80))
-            
-            base_blue = 120 + wave1 + wave2
-            ocean_color = [
-                int(base_blue * 0.3),  # Low red
-                int(base_blue * 0.6),  # Medium green
-                min(255, base_blue)    # Full blue
-            ]
-            
-            img[y, :] = ocean_color
-            
-        # Add horizontal wave movement
-        wave_shift = int(40 * np.sin(t * 0.6))
-        img = np.roll(img, wave_shift, axis=1)
-        
-        return img
-    
-    return VideoClip(make_frame, duration=duration)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from create_six_more_themes import create_ocean_waves_background
+from overlay_compositor import composite_overlays
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from tts_cache import synthesize_speech
 
 def create_themed_video():
     print("🌊 CREATING OCEAN WAVES THEME - BAPTISM & RENEWAL")
@@ -46,13 +23,10 @@ def create_themed_video():
     
     # Generate Korean TTS
     print("🎤 Generating Korean audio...")
-    tts = gTTS(text=korean_script, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as audio_file:
-        tts.save(audio_file.name)
-        audio = AudioFileClip(audio_file.name)
-        duration = audio.duration
-        print(f"   Audio duration: {duration:.1f} seconds")
+    speech = synthesize_speech(korean_script, lang='ko', slow=False)
+    duration = speech.duration
+    print(f"   Audio duration: {duration:.1f} seconds "
+          f"({'TTS cache hit' if speech.cached else 'synthesized'})")
     
     # Create ocean waves background
     print("🎨 Creating ocean waves background...")
@@ -61,7 +35,7 @@ def create_themed_video():
     # Add text overlays
     print("📝 Adding text overlay...")
     
-    title_clip = TextClip(
+    title_clip = text_clip(
         "진리의 말씀\n세례와 새생명",
         fontsize=55,
         color='white',
@@ -70,7 +44,7 @@ def create_themed_video():
         stroke_width=3
     ).set_position(('center', 280)).set_duration(duration)
     
-    subtitle_clip = TextClip(
+    subtitle_clip = text_clip(
         "거듭남의 은혜",
         fontsize=38,
         color='lightcyan',
@@ -81,31 +55,28 @@ def create_themed_video():
     
     # Compose final video
     print("🎬 Composing final video...")
-    final_video = CompositeVideoClip([
+    final_video = composite_overlays([
         background,
         title_clip,
         subtitle_clip
-    ]).set_audio(audio)
+    ])
     
     # Export video
     output_file = "ocean_waves_theme.mp4"
     print(f"💾 Exporting to {output_file}...")
     
-    final_video.write_videofile(
+    write_videofile_muxed(
+        final_video,
         output_file,
         fps=24,
+        audio_file=speech.path,
         codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None
+        audio_codec='aac'
     )
     
     # Cleanup
     final_video.close()
-    audio.close()
-    os.unlink(audio_file.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     print(f"✅ Video created: {file_size:.1f}MB")
@@ -189,4 +160,5 @@ def main():
         os.remove(video_file)
 
 if __name__ == "__main__":
+    check_fonts()  # fail before synthesizing any audio
     main()
\ No newline at end of file
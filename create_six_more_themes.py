@@ -1,238 +1,233 @@
 #!/usr/bin/env python3
 
+import functools
 import os
+import sys
 import json
 import requests
 import numpy as np
-from moviepy.editor import *
-from gtts import gTTS
-import tempfile
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-def create_ocean_waves_background(duration, size=(1080, 1920)):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from alpha_blend import blend_solid
+from background_cache import cached_background, loop_period
+from overlay_cache import overlay_cache
+from overlay_compositor import composite_overlays
+from palettes import ThresholdPalette
+from parallel_export import default_render_workers, write_videofile_parallel
+from render_output import write_videofile_muxed
+from sprites import SpriteLayer, style_variant
+from text_raster import check_fonts, text_clip
+from theme_layers import InPlaceBackground, RowConstantBackground
+from tts_cache import synthesize_speech, tts_cache
+
+def create_ocean_waves_background(duration, size=(1080, 1920), fps=24):
     """Create flowing ocean waves for baptism/renewal theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        for y in range(size[1]):
-            # Ocean blue gradient with waves
-            wave1 = int(30 * np.sin(t * 0.8 + y / 50))
-            wave2 = int(20 * np.sin(t * 1.2 + y / 80))
-            
-            base_blue = 120 + wave1 + wave2
-            ocean_color = [
-                int(base_blue * 0.3),  # Low red
-                int(base_blue * 0.6),  # Medium green
-                min(255, base_blue)    # Full blue
-            ]
-            
-            img[y, :] = ocean_color
-            
-        # Add horizontal wave movement
-        wave_shift = int(40 * np.sin(t * 0.6))
-        img = np.roll(img, wave_shift, axis=1)
+    rows = np.arange(size[1])
+    
+    def ocean_column(t):
+        # Ocean blue gradient with waves
+        wave1 = (30 * np.sin(t * 0.8 + rows / 50)).astype(np.int64)
+        wave2 = (20 * np.sin(t * 1.2 + rows / 80)).astype(np.int64)
         
-        return img
+        base_blue = 120 + wave1 + wave2
+        return np.stack([
+            (base_blue * 0.3).astype(np.int64),  # Low red
+            (base_blue * 0.6).astype(np.int64),  # Medium green
+            np.minimum(255, base_blue)           # Full blue
+        ], axis=1)
     
-    return VideoClip(make_frame, duration=duration)
+    # Rows are uniform, so the old horizontal np.roll wave never moved a pixel
+    make_frame = RowConstantBackground(ocean_column, size).make_frame
+    
+    return cached_background('ocean_waves', make_frame, duration, size, fps, period=loop_period(0.8, 1.2, 0.6))
 
-def create_forest_light_background(duration, size=(1080, 1920)):
+def create_forest_light_background(duration, size=(1080, 1920), fps=24):
     """Create forest with divine light rays for nature/creation theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    gradient = np.arange(size[1]) / size[1]
+    
+    # Light rays fade out towards the middle of the frame
+    ray_rows = size[1] // 2
+    ray_intensity = (80 * (1 - np.arange(ray_rows) / ray_rows)).astype(np.int64)
+    ray_boost = np.stack([ray_intensity, ray_intensity, ray_intensity // 2], axis=1)
+    ray_starts = np.arange(0, size[0], 60)
+    
+    def render_frame(img, t):
+        # Forest green gradient with light from the top
+        light_intensity = (100 * (1 - gradient) * (0.8 + 0.2 * np.sin(t * 2))).astype(np.int64)
+        green_base = (60 + 40 * gradient + light_intensity).astype(np.int64)
+        forest_column = np.stack([
+            (green_base * 0.4).astype(np.int64),  # Brown undertones
+            np.minimum(255, green_base),          # Green
+            (green_base * 0.3).astype(np.int64)   # Low blue
+        ], axis=1)
         
-        # Forest green gradient
-        for y in range(size[1]):
-            gradient = y / size[1]
-            
-            # Light rays from top
-            light_intensity = int(100 * (1 - gradient) * (0.8 + 0.2 * np.sin(t * 2)))
-            
-            # Forest colors
-            green_base = int(60 + 40 * gradient + light_intensity)
-            forest_color = [
-                int(green_base * 0.4),  # Brown undertones
-                min(255, green_base),   # Green
-                int(green_base * 0.3)   # Low blue
-            ]
-            
-            img[y, :] = forest_color
-            
-        # Add moving light rays
-        for x in range(0, size[0], 60):
-            ray_x = x + int(20 * np.sin(t * 0.5))
-            if 0 <= ray_x < size[0]:
-                for y in range(0, size[1] // 2):
-                    ray_intensity = int(80 * (1 - y / (size[1] // 2)))
-                    img[y, ray_x:ray_x+3] = [
-                        min(255, img[y, ray_x, 0] + ray_intensity),
-                        min(255, img[y, ray_x, 1] + ray_intensity),
-                        min(255, img[y, ray_x, 2] + ray_intensity // 2)
-                    ]
+        img[:] = forest_column[:, np.newaxis, :]
+        
+        # Moving light rays: 3-pixel columns brightened over the forest gradient
+        ray_x = ray_starts + int(20 * np.sin(t * 0.5))
+        ray_x = ray_x[(ray_x >= 0) & (ray_x < size[0])]
+        ray_columns = (ray_x[:, np.newaxis] + np.arange(3)).ravel()
+        ray_columns = ray_columns[ray_columns < size[0]]
         
-        return img
+        ray_color = np.minimum(255, forest_column[:ray_rows] + ray_boost)
+        img[:ray_rows, ray_columns] = ray_color[:, np.newaxis, :]
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('forest_light', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(2, 0.5))
+
+# Star with a cross pattern: bright centre, half-bright neighbours
+STAR_STAMP = np.array([
+    [0.0, 0.5, 0.0],
+    [0.5, 1.0, 0.5],
+    [0.0, 0.5, 0.0]
+])
 
-def create_starry_night_background(duration, size=(1080, 1920)):
+def create_starry_night_background(duration, size=(1080, 1920), fps=24, seed=42):
     """Create starry night for night prayer/reflection theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Dark night sky gradient
-        for y in range(size[1]):
-            night_intensity = int(20 + 15 * (y / size[1]))
-            night_color = [night_intensity, night_intensity, int(night_intensity * 1.5)]
-            img[y, :] = night_color
-            
-        # Add twinkling stars
-        np.random.seed(42)  # Fixed seed for consistent stars
-        star_positions = [(np.random.randint(0, size[0]), np.random.randint(0, size[1])) 
-                         for _ in range(50)]
-        
-        for i, (sx, sy) in enumerate(star_positions):
-            twinkle = 0.5 + 0.5 * np.sin(t * 3 + i * 0.5)
-            star_brightness = int(255 * twinkle)
-            
-            # Draw star with cross pattern
-            if 0 <= sx < size[0] and 0 <= sy < size[1]:
-                img[sy, sx] = [star_brightness, star_brightness, star_brightness]
-                if sx > 0: img[sy, sx-1] = [star_brightness//2, star_brightness//2, star_brightness//2]
-                if sx < size[0]-1: img[sy, sx+1] = [star_brightness//2, star_brightness//2, star_brightness//2]
-                if sy > 0: img[sy-1, sx] = [star_brightness//2, star_brightness//2, star_brightness//2]
-                if sy < size[1]-1: img[sy+1, sx] = [star_brightness//2, star_brightness//2, star_brightness//2]
+    # Dark night sky gradient
+    night_intensity = (20 + 15 * (np.arange(size[1]) / size[1])).astype(np.int64)
+    night_column = np.stack([
+        night_intensity,
+        night_intensity,
+        (night_intensity * 1.5).astype(np.int64)
+    ], axis=1).astype(np.uint8)
+    
+    # Twinkling stars: positions are fixed for the whole video
+    rng = np.random.RandomState(seed)
+    star_positions = np.array([(rng.randint(0, size[0]), rng.randint(0, size[1]))
+                               for _ in range(50)])
+    star_phases = np.arange(len(star_positions)) * 0.5
+    stars = SpriteLayer(STAR_STAMP, size)
+    
+    def render_frame(img, t):
+        img[:] = night_column[:, np.newaxis, :]
         
-        return img
+        twinkle = 0.5 + 0.5 * np.sin(t * 3 + star_phases)
+        star_brightness = (255 * twinkle).astype(np.int64)
+        stars.paint(img, star_positions, star_brightness)
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background(f'starry_night_{seed}', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(3))
 
-def create_flame_background(duration, size=(1080, 1920)):
+# Flame colour stops by height above the bottom; out-of-range channels wrap
+# exactly as the original per-row uint8 stores did
+FLAME_PALETTE = ThresholdPalette([
+    (0.7, lambda flicker: (255, 150 + flicker, 50 + flicker//2)),               # Bottom - hot red/orange
+    (0.4, lambda flicker: (255, 200 + flicker, 100 + flicker)),                 # Middle - orange/yellow
+    (None, lambda flicker: (255 - flicker//2, 255 - flicker//3, 200 + flicker)),  # Top - yellow/white
+], descending=True, clamp=False)
+
+def create_flame_background(duration, size=(1080, 1920), fps=24):
     """Create holy fire/spirit flame background"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Flame colors from bottom to top
-        for y in range(size[1]):
-            flame_pos = (size[1] - y) / size[1]  # Bottom to top
-            
-            # Flame movement
-            flicker = int(30 * np.sin(t * 4 + y / 30) * flame_pos)
-            
-            if flame_pos > 0.7:  # Bottom - hot red/orange
-                flame_color = [255, int(150 + flicker), int(50 + flicker//2)]
-            elif flame_pos > 0.4:  # Middle - orange/yellow
-                flame_color = [255, int(200 + flicker), int(100 + flicker)]
-            else:  # Top - yellow/white
-                flame_color = [int(255 - flicker//2), int(255 - flicker//3), int(200 + flicker)]
-            
-            img[y, :] = flame_color
-            
-        # Add flame movement
-        wave = int(25 * np.sin(t * 2))
-        img = np.roll(img, wave, axis=1)
-        
-        return img
+    # Flame colors from bottom to top
+    rows = np.arange(size[1])
+    flame_pos = (size[1] - rows) / size[1]
+    flame_bands = FLAME_PALETTE.band_index(flame_pos)
+    flame_colours = FLAME_PALETTE.lookup_table(-30, 30)
+    
+    def flame_column(t):
+        # Flame movement
+        flicker = (30 * np.sin(t * 4 + rows / 30) * flame_pos).astype(np.int64)
+        return flame_colours(flame_bands, flicker)
+    
+    # Rows are uniform, so the old horizontal np.roll flame movement never moved a pixel
+    make_frame = RowConstantBackground(flame_column, size).make_frame
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('holy_flame', make_frame, duration, size, fps, period=loop_period(4, 2))
 
-def create_rainbow_covenant_background(duration, size=(1080, 1920)):
+RAINBOW_COLORS = [
+    [255, 0, 0],     # Red
+    [255, 127, 0],   # Orange
+    [255, 255, 0],   # Yellow
+    [0, 255, 0],     # Green
+    [0, 0, 255],     # Blue
+    [75, 0, 130],    # Indigo
+    [148, 0, 211]    # Violet
+]
+
+@functools.lru_cache(maxsize=4)
+def rainbow_band_field(size):
+    """Pixel coordinates of every rainbow band, computed once per frame size.
+
+    Returns one (ys, xs) pair of index arrays per colour: the pixels of the
+    upper half of the frame whose distance from the arc centre lies within the
+    band's thickness.
+    """
+    center_x, center_y = size[0] // 2, size[1] + 200
+    thickness = 15
+    
+    # Radial distance field for the upper part of the arc
+    ys, xs = np.mgrid[0:size[1] // 2, 0:size[0]]
+    dist = np.sqrt((xs - center_x)**2 + (ys - center_y)**2)
+    
+    bands = []
+    for color_idx in range(len(RAINBOW_COLORS)):
+        radius = 400 + color_idx * 20
+        band_ys, band_xs = np.nonzero((radius - thickness <= dist) & (dist <= radius + thickness))
+        bands.append((band_ys, band_xs))
+    return bands
+
+def create_rainbow_covenant_background(duration, size=(1080, 1920), fps=24):
     """Create rainbow for covenant/promise theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Soft sky background
-        for y in range(size[1]):
-            sky_intensity = int(180 + 30 * (1 - y / size[1]))
-            sky_color = [int(sky_intensity * 0.8), int(sky_intensity * 0.9), sky_intensity]
-            img[y, :] = sky_color
-        
-        # Rainbow arc
-        center_x, center_y = size[0] // 2, size[1] + 200
-        rainbow_colors = [
-            [255, 0, 0],     # Red
-            [255, 127, 0],   # Orange
-            [255, 255, 0],   # Yellow
-            [0, 255, 0],     # Green
-            [0, 0, 255],     # Blue
-            [75, 0, 130],    # Indigo
-            [148, 0, 211]    # Violet
-        ]
+    # Soft sky background
+    sky_intensity = (180 + 30 * (1 - np.arange(size[1]) / size[1])).astype(np.int64)
+    sky_column = np.stack([
+        (sky_intensity * 0.8).astype(np.int64),
+        (sky_intensity * 0.9).astype(np.int64),
+        sky_intensity
+    ], axis=1).astype(np.uint8)
+    
+    bands = rainbow_band_field(tuple(size))
+    
+    def render_frame(img, t):
+        img[:] = sky_column[:, np.newaxis, :]
         
-        # Draw rainbow bands
-        for color_idx, color in enumerate(rainbow_colors):
-            radius = 400 + color_idx * 20
-            thickness = 15
-            
-            # Gentle movement
+        # Blend each rainbow band, shifted by its gentle movement
+        for color_idx, (band_ys, band_xs) in enumerate(bands):
             wave_offset = int(10 * np.sin(t * 0.5 + color_idx * 0.3))
+            alpha = 0.6 + 0.2 * np.sin(t + color_idx)
             
-            for y in range(size[1]):
-                for x in range(size[0]):
-                    dist = np.sqrt((x - center_x)**2 + (y - center_y)**2)
-                    if radius - thickness <= dist <= radius + thickness:
-                        if y < size[1] // 2:  # Only upper part of arc
-                            alpha = 0.6 + 0.2 * np.sin(t + color_idx)
-                            img[y + wave_offset, x] = [
-                                int(img[y + wave_offset, x, 0] * (1-alpha) + color[0] * alpha),
-                                int(img[y + wave_offset, x, 1] * (1-alpha) + color[1] * alpha),
-                                int(img[y + wave_offset, x, 2] * (1-alpha) + color[2] * alpha)
-                            ]
-        
-        return img
+            # Negative rows wrap to the bottom, as the per-pixel indexing did
+            target_ys = (band_ys + wave_offset) % size[1]
+            img[target_ys, band_xs] = blend_solid(img[target_ys, band_xs], RAINBOW_COLORS[color_idx], alpha)
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('rainbow_covenant', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.5, 1))
+
+def soft_cloud_stamp(half_height, half_width, radius):
+    """Cloud puff fading linearly from 0.3 at its centre to 0 at `radius`"""
+    dy, dx = np.mgrid[-half_height:half_height + 1, -half_width:half_width + 1]
+    dist = np.sqrt(dx*dx + dy*dy)
+    return np.where(dist < radius, (radius - dist) / radius * 0.3, 0.0)
 
-def create_dove_peace_background(duration, size=(1080, 1920)):
+def create_dove_peace_background(duration, size=(1080, 1920), fps=24):
     """Create peaceful dove with olive branch theme"""
-    def make_frame(t):
-        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-        
-        # Peaceful sky gradient
-        for y in range(size[1]):
-            gradient = y / size[1]
-            peace_intensity = int(200 + 40 * gradient)
-            peace_color = [
-                int(peace_intensity * 0.9),  # Soft white
-                int(peace_intensity * 0.95), # Slightly blue-white
-                peace_intensity              # Pure white
-            ]
-            img[y, :] = peace_color
+    # Peaceful sky gradient
+    peace_intensity = (200 + 40 * (np.arange(size[1]) / size[1])).astype(np.int64)
+    peace_column = np.stack([
+        (peace_intensity * 0.9).astype(np.int64),   # Soft white
+        (peace_intensity * 0.95).astype(np.int64),  # Slightly blue-white
+        peace_intensity                             # Pure white
+    ], axis=1).astype(np.uint8)
+    
+    # Gentle clouds on a fixed grid that drifts sideways
+    cloud_ys, cloud_xs = np.mgrid[size[1] // 3:2 * size[1] // 3:40, 0:size[0]:80]
+    cloud_anchors = np.stack([cloud_xs.ravel(), cloud_ys.ravel()], axis=1)
+    clouds = SpriteLayer(soft_cloud_stamp(15, 30, 25), size, anchor_inside=True)
+    
+    def render_frame(img, t):
+        img[:] = peace_column[:, np.newaxis, :]
         
-        # Gentle clouds
         cloud_offset = int(20 * np.sin(t * 0.3))
-        for y in range(size[1] // 3, 2 * size[1] // 3, 40):
-            for x in range(0, size[0], 80):
-                cloud_x = x + cloud_offset
-                if 0 <= cloud_x < size[0]:
-                    # Soft cloud shapes
-                    for dy in range(-15, 16):
-                        for dx in range(-30, 31):
-                            if y + dy >= 0 and y + dy < size[1] and cloud_x + dx >= 0 and cloud_x + dx < size[0]:
-                                dist = np.sqrt(dx*dx + dy*dy)
-                                if dist < 25:
-                                    cloud_alpha = (25 - dist) / 25 * 0.3
-                                    cloud_white = int(255 * cloud_alpha)
-                                    img[y + dy, cloud_x + dx] = [
-                                        min(255, img[y + dy, cloud_x + dx, 0] + cloud_white),
-                                        min(255, img[y + dy, cloud_x + dx, 1] + cloud_white),
-                                        min(255, img[y + dy, cloud_x + dx, 2] + cloud_white)
-                                    ]
+        clouds.add(img, cloud_anchors + [cloud_offset, 0], 255)
         
         # Subtle dove silhouette movement
         dove_y = size[1] // 2 + int(30 * np.sin(t * 0.8))
         dove_x = size[0] // 2 + int(50 * np.sin(t * 0.6))
         
-        # Simple dove shape (abstract)
+        # Simple dove shape (abstract wing span)
         if 0 <= dove_x < size[0] and 0 <= dove_y < size[1]:
-            for dy in range(-5, 6):
-                for dx in range(-10, 11):
-                    if 0 <= dove_y + dy < size[1] and 0 <= dove_x + dx < size[0]:
-                        if abs(dy) <= 2 and abs(dx) <= 8:  # Wing span
-                            img[dove_y + dy, dove_x + dx] = [240, 240, 255]
-        
-        return img
+            img[max(0, dove_y - 2):dove_y + 3, max(0, dove_x - 8):dove_x + 9] = [240, 240, 255]
     
-    return VideoClip(make_frame, duration=duration)
+    return cached_background('dove_peace', InPlaceBackground(render_frame, size).make_frame, duration, size, fps, period=loop_period(0.3, 0.8, 0.6))
 
 def create_themed_video(theme_config):
     theme_name = theme_config['name']
@@ -244,13 +239,10 @@ def create_themed_video(theme_config):
     
     # Generate Korean TTS
     print("🎤 Generating Korean audio...")
-    tts = gTTS(text=korean_script, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as audio_file:
-        tts.save(audio_file.name)
-        audio = AudioFileClip(audio_file.name)
-        duration = audio.duration
-        print(f"   Audio duration: {duration:.1f} seconds")
+    speech = synthesize_speech(korean_script, lang='ko', slow=False)
+    duration = speech.duration
+    print(f"   Audio duration: {duration:.1f} seconds "
+          f"({'TTS cache hit' if speech.cached else 'synthesized'})")
     
     # Create theme-specific background
     print(f"🎨 Creating {theme_name} background...")
@@ -259,7 +251,8 @@ def create_themed_video(theme_config):
     elif theme_name == "forest_light":
         background = create_forest_light_background(duration)
     elif theme_name == "starry_night":
-        background = create_starry_night_background(duration)
+        # Star positions come from one of a few cached variants, chosen per video
+        background = create_starry_night_background(duration, seed=style_variant(theme_name, korean_script))
     elif theme_name == "holy_flame":
         background = create_flame_background(duration)
     elif theme_name == "rainbow_covenant":
@@ -270,7 +263,7 @@ def create_themed_video(theme_config):
     # Add text overlays
     print("📝 Adding text overlay...")
     
-    title_clip = TextClip(
+    title_clip = text_clip(
         theme_config['title_text'],
         fontsize=55,
         color='white',
@@ -279,7 +272,7 @@ def create_themed_video(theme_config):
         stroke_width=3
     ).set_position(('center', 280)).set_duration(duration)
     
-    subtitle_clip = TextClip(
+    subtitle_clip = text_clip(
         theme_config['subtitle_text'],
         fontsize=38,
         color=theme_config.get('subtitle_color', 'lightyellow'),
@@ -290,31 +283,40 @@ def create_themed_video(theme_config):
     
     # Compose final video
     print("🎬 Composing final video...")
-    final_video = CompositeVideoClip([
+    final_video = composite_overlays([
         background,
         title_clip,
         subtitle_clip
-    ]).set_audio(audio)
+    ])
     
     # Export video
     output_file = f"theme_{theme_name}.mp4"
     print(f"💾 Exporting to {output_file}...")
     
-    final_video.write_videofile(
-        output_file,
-        fps=24,
-        codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None
-    )
+    render_workers = theme_config.get('render_workers', default_render_workers())
+    if render_workers > 1:
+        write_videofile_parallel(
+            final_video,
+            output_file,
+            fps=24,
+            workers=render_workers,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac'
+        )
+    else:
+        write_videofile_muxed(
+            final_video,
+            output_file,
+            fps=24,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac'
+        )
     
     # Cleanup
     final_video.close()
-    audio.close()
-    os.unlink(audio_file.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     print(f"✅ Video created: {file_size:.1f}MB")
@@ -487,6 +489,8 @@ def main():
     print(f"\n{'='*60}")
     print("🎉 ALL 6 NEW SPIRITUAL THEMES COMPLETE!")
     print(f"{'='*60}")
+    overlay_cache().print_stats()
+    tts_cache().print_stats()
     
     print("\n📱 COMPLETE 10-THEME SPIRITUAL SHOWCASE:")
     print("   🌟 Golden Light (Worship): https://youtu.be/6Bugm87RFQo")
@@ -513,4 +517,5 @@ def main():
     print("\n✨ Complete 10-theme spiritual collection - perfect variety for invitees! 🚀")
 
 if __name__ == "__main__":
+    check_fonts()  # fail before synthesizing any audio
     main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Fixed-point alpha blending on uint8 pixels.
+
+moviepy composites with float mask arrays the size of the whole overlay, and
+theme effects blended with `img * (1 - alpha) + colour * alpha`, each
+allocating float64 copies. These kernels stay in 16-bit integers: sources
+are premultiplied uint8 RGBA, a global opacity (for fades) is a weight out
+of 256, and division by 255 is done exactly with shifts. Only the
+destination region under the source's bounding box is read or written.
+"""
+import numpy as np
+
+def _div255(values):
+    """round(values / 255) in place for uint16 values up to 255 * 255"""
+    values += 128
+    values += values >> 8
+    values >>= 8
+    return values
+
+def opacity_weight(opacity):
+    """Opacity in 0..1 as an integer weight out of 256"""
+    return int(round(min(1.0, max(0.0, opacity)) * 256))
+
+def blend_premultiplied(dst, pixels, x=0, y=0, opacity=1.0):
+    """Blend premultiplied RGBA `pixels` over `dst` at (x, y), in place.
+
+    `dst` is an RGB frame, or a premultiplied RGBA layer whose alpha is
+    composited too. Pixels outside `dst` are skipped and nothing outside the
+    source's box is touched.
+    """
+    height, width = dst.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + pixels.shape[1]), min(height, y + pixels.shape[0])
+    weight = opacity_weight(opacity)
+    if x0 >= x1 or y0 >= y1 or weight == 0:
+        return dst
+
+    region = dst[y0:y1, x0:x1]
+    source = pixels[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.uint16)
+    if weight < 256:
+        source *= weight
+        source += 128
+        source >>= 8
+
+    channels = region.shape[2]
+    blended = region.astype(np.uint16)
+    blended *= 255 - source[:, :, 3:4]
+    _div255(blended)
+    blended += source[:, :, :channels]
+    np.copyto(region, blended, casting='unsafe')
+    return dst
+
+def blend_solid(dst, colour, opacity):
+    """dst = dst * (1 - opacity) + colour * opacity for uint8 RGB pixels, in place"""
+    weight = opacity_weight(opacity)
+    blended = dst.astype(np.uint16)
+    blended *= 256 - weight
+    blended += np.asarray(colour, dtype=np.uint16) * weight + 128
+    blended >>= 8
+    np.copyto(dst, blended, casting='unsafe')
+    return dst
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Narration MP3s handed from the audio stage to the video stage.
+
+generate_audio.py writes the MP3 next to a JSON sidecar with its duration,
+sample rate and a content hash; generate_video.py reads the sidecar instead
+of synthesizing the script again. Both files are written to a temporary
+name and renamed into place, so a stage that is killed halfway never
+leaves an artifact the next stage would trust. The hash lets the video
+stage notice an MP3 that was replaced after its sidecar was written.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from mp3_frames import iter_frames
+
+ARTIFACT_FORMAT_VERSION = 1
+
+def sidecar_path(audio_file):
+    return f"{audio_file}.json"
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def sample_rate(data):
+    """Sample rate of the first audio frame, None if there is no MP3 frame"""
+    frame = next(iter_frames(data), None)
+    return frame.sample_rate if frame else None
+
+class AudioArtifact:
+    """An MP3 on disk with the facts later stages need about it"""
+
+    def __init__(self, path, duration, sample_rate, sha256):
+        self.path = path
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.sha256 = sha256
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def write_artifact(speech, audio_file, **extra):
+    """Copy `speech` to `audio_file` and write its sidecar; returns the AudioArtifact"""
+    with open(speech.path, 'rb') as f:
+        data = f.read()
+    artifact = AudioArtifact(audio_file, speech.duration, sample_rate(data), content_hash(data))
+    meta = {
+        'version': ARTIFACT_FORMAT_VERSION,
+        'duration': artifact.duration,
+        'sample_rate': artifact.sample_rate,
+        'sha256': artifact.sha256,
+        'bytes': len(data),
+        **extra,
+    }
+    _write_atomic(audio_file, data)
+    _write_atomic(sidecar_path(audio_file), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    return artifact
+
+def load_artifact(audio_file):
+    """The AudioArtifact for `audio_file`, or None if its sidecar is missing or stale"""
+    try:
+        with open(sidecar_path(audio_file), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(audio_file, 'rb') as f:
+            data = f.read()
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != ARTIFACT_FORMAT_VERSION or meta.get('sha256') != content_hash(data):
+        return None
+    return AudioArtifact(audio_file, meta['duration'], meta.get('sample_rate'), meta['sha256'])
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Disk cache of rendered theme background loops.
+
+Every theme's make_frame is a sum of sinusoids in `t`, so its background
+repeats. Instead of re-rendering it for every video we render one loop per
+(theme, size, fps) - one full period - and store it as raw RGB frames that
+are memory-mapped back in. Any duration is then served by indexing into the
+loop, with output identical to rendering every frame. When make_frame
+belongs to a theme layer with render_into, frames are drawn directly into
+the cache file. Entries are evicted least-recently-used under a disk budget.
+
+Themes whose period is longer than the loop limit are rendered directly.
+Cutting them to a bounded loop whose seam is cross-faded makes the
+background visibly repeat, so it is opt-in (BACKGROUND_CACHE_CUT_LOOPS).
+
+Costs and limits:
+- On a miss the loop is filled lazily, frame by frame as the video asks for
+  them, and only stored once every frame has been drawn. A video shorter
+  than the loop costs no more than rendering it directly, but leaves
+  nothing in the cache.
+- Keys cover the theme key, size, fps, loop length and the kernel's code,
+  not the data it closes over. The metadata records a digest of the loop's
+  first frame; a hit renders that one frame again (into a private buffer,
+  so pooled kernels are untouched) and treats a mismatch - edited colours,
+  palettes or captured sizes - as a miss.
+
+Configuration (environment):
+    BACKGROUND_CACHE_DIR                where loops are stored
+    BACKGROUND_CACHE_MAX_BYTES          disk budget, 0 disables the cache
+    BACKGROUND_CACHE_MAX_LOOP_SECONDS   longest loop that will be rendered
+    BACKGROUND_CACHE_CUT_LOOPS          1 to cut longer periods to a cross-faded loop
+"""
+import hashlib
+import json
+import math
+import os
+import tempfile
+import time
+import weakref
+from fractions import Fraction
+
+import numpy as np
+from moviepy.editor import VideoClip
+
+from disk_lru import evict, lazy_default
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tmp', 'background_cache'
+)
+DEFAULT_MAX_BYTES = 8 * 1024 ** 3  # 8 GB
+DEFAULT_MAX_LOOP_SECONDS = 15.0
+SEAM_SECONDS = 1.0  # cross-fade length used when a loop is cut short of its period
+
+def loop_period(*angular_frequencies):
+    """Return the common period in seconds of sinusoids sin(w * t + phase).
+
+    Frequencies are in radians per second, e.g. loop_period(0.8, 1.2) for a
+    theme using sin(t * 0.8) and sin(t * 1.2). Returns 0 for a static theme.
+    """
+    fractions = [Fraction(abs(w)).limit_denominator(1000) for w in angular_frequencies if w]
+    if not fractions:
+        return 0.0
+
+    numerator = 0
+    denominator = 1
+    for fraction in fractions:
+        numerator = math.gcd(numerator, fraction.numerator)
+        denominator = denominator * fraction.denominator // math.gcd(denominator, fraction.denominator)
+
+    return 2 * math.pi * denominator / numerator
+
+def _code_fingerprint(code):
+    """Stable digest input for a kernel's bytecode, including nested functions"""
+    parts = [code.co_code]
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            parts.append(_code_fingerprint(const))
+        else:
+            parts.append(repr(const).encode('utf-8'))
+    return b'|'.join(parts)
+
+def _kernel_fingerprint(make_frame):
+    """Digest input for a make_frame function or a theme object's bound method"""
+    parts = [_code_fingerprint(make_frame.__code__)]
+    owner = getattr(make_frame, '__self__', None)
+    if owner is not None:
+        for name, value in sorted(vars(owner).items()):
+            if hasattr(value, '__code__'):
+                parts.append(name.encode('utf-8') + _code_fingerprint(value.__code__))
+    return b'|'.join(parts)
+
+def _frame_digest(frame):
+    frame = np.ascontiguousarray(frame, dtype=np.uint8)
+    digest = hashlib.sha1(repr(frame.shape).encode('utf-8'))
+    digest.update(memoryview(frame).cast('B'))
+    return digest.hexdigest()
+
+def _first_frame(make_frame, shape):
+    """Frame 0 of a kernel, drawn into a private buffer when it renders in place"""
+    render_into = getattr(getattr(make_frame, '__self__', None), 'render_into', None)
+    if render_into is None:
+        return make_frame(0)
+    frame = np.empty(shape, dtype=np.uint8)
+    render_into(frame, 0)
+    return frame
+
+class _LazyLoop:
+    """Loop frames rendered on first use into a temporary cache file.
+
+    Once every frame has been drawn the seam is blended and the file is
+    renamed into the cache with its metadata; a loop that is never completed
+    is deleted when the process lets go of it.
+    """
+
+    def __init__(self, cache, make_frame, fps, frame_count, seam_count, data_path, meta_path,
+                 shape, meta):
+        self.cache = cache
+        self.make_frame = make_frame
+        self.render_into = getattr(getattr(make_frame, '__self__', None), 'render_into', None)
+        self.fps = fps
+        self.frame_count = frame_count
+        self.seam_count = seam_count
+        self.data_path = data_path
+        self.meta_path = meta_path
+        self.meta = meta
+        self.rendered = np.zeros(frame_count, dtype=bool)
+        self.remaining = frame_count
+        self.render_start = time.time()
+
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.cache_dir, suffix='.rgb.tmp')
+        os.close(fd)
+        self._cleanup = weakref.finalize(self, _unlink_quietly, self.temp_path)
+        self.frames = np.memmap(self.temp_path, dtype=np.uint8, mode='w+', shape=shape)
+
+    def frame(self, frame_num):
+        if not self.rendered[frame_num]:
+            if self.render_into is not None:
+                self.render_into(self.frames[frame_num], frame_num / self.fps)
+            else:
+                self.frames[frame_num] = self.make_frame(frame_num / self.fps)
+            self.rendered[frame_num] = True
+            self.remaining -= 1
+            if self.remaining == 0:
+                self._complete()
+        return self.frames[frame_num]
+
+    def _complete(self):
+        # Forked export workers share the file: the first to finish claims it
+        claimed_path = f"{self.temp_path}.done"
+        try:
+            os.rename(self.temp_path, claimed_path)
+        except FileNotFoundError:
+            return
+        self._cleanup.detach()
+        self.meta['first_frame'] = _frame_digest(self.frames[0])
+        self.cache._blend_seam(self.frames, self.make_frame, self.fps,
+                               self.frame_count, self.seam_count)
+        self.frames.flush()
+        os.replace(claimed_path, self.data_path)
+        self.cache._write_meta(self.meta_path, self.meta)
+        print(f"   ✅ Background loop cached in {time.time() - self.render_start:.1f}s")
+
+def _unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class BackgroundCache:
+    """Renders, stores and serves seamless background loops"""
+
+    def __init__(self, cache_dir=None, max_bytes=None, max_loop_seconds=None, cut_loops=None):
+        self.cache_dir = cache_dir or os.environ.get('BACKGROUND_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else os.environ.get('BACKGROUND_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.max_loop_seconds = float(max_loop_seconds if max_loop_seconds is not None
+                                      else os.environ.get('BACKGROUND_CACHE_MAX_LOOP_SECONDS',
+                                                          DEFAULT_MAX_LOOP_SECONDS))
+        self.cut_loops = bool(int(cut_loops if cut_loops is not None
+                                  else os.environ.get('BACKGROUND_CACHE_CUT_LOOPS', 0)))
+
+    def loop_frames(self, fps, period):
+        """Return (loop_frames, seam_frames) for a theme with the given period.
+
+        Returns None when the theme cannot be looped without changing its
+        output and cut loops are not enabled.
+        """
+        if period == 0:
+            return 1, 0
+
+        if period is not None and period <= self.max_loop_seconds:
+            return max(1, int(round(period * fps))), 0
+
+        if not self.cut_loops:
+            return None
+        return max(1, int(round(self.max_loop_seconds * fps))), int(round(SEAM_SECONDS * fps))
+
+    def clip(self, theme_key, make_frame, duration, size, fps, period=None):
+        """Return a VideoClip of `duration` seconds served from the cached loop"""
+        loop_frames = self.loop_frames(fps, period)
+        if loop_frames is None:
+            return VideoClip(make_frame, duration=duration)
+
+        frame_count, seam_count = loop_frames
+        entry_bytes = frame_count * size[0] * size[1] * 3
+        if self.max_bytes <= 0 or entry_bytes > self.max_bytes:
+            return VideoClip(make_frame, duration=duration)
+
+        loop = self.load_or_render(theme_key, make_frame, size, fps, frame_count, seam_count)
+        if isinstance(loop, _LazyLoop):
+            def cached_frame(t):
+                return loop.frame(int(round(t * fps)) % frame_count)
+        else:
+            def cached_frame(t):
+                return loop[int(round(t * fps)) % frame_count]
+
+        return VideoClip(cached_frame, duration=duration)
+
+    def load_or_render(self, theme_key, make_frame, size, fps, frame_count, seam_count):
+        """The memory-mapped loop on a hit, otherwise a _LazyLoop that stores it when complete"""
+        key = self._key(theme_key, make_frame, size, fps, frame_count, seam_count)
+        data_path = os.path.join(self.cache_dir, f"{key}.rgb")
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+        shape = (frame_count, size[1], size[0], 3)
+
+        if os.path.exists(data_path) and self._fresh(meta_path, make_frame, shape[1:]):
+            os.utime(meta_path)  # mark as recently used
+            print(f"   ♻️ Background loop cache hit: {theme_key} ({frame_count} frames)")
+            return np.memmap(data_path, dtype=np.uint8, mode='r', shape=shape)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_bytes = frame_count * size[0] * size[1] * 3
+        evict(self.cache_dir, '.rgb', self.max_bytes, entry_bytes)
+
+        print(f"   🎞️ Rendering {frame_count}-frame background loop for {theme_key} as it plays...")
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'theme': theme_key,
+            'size': list(size),
+            'fps': fps,
+            'frames': frame_count,
+            'seam_frames': seam_count,
+            'bytes': entry_bytes,
+        }
+        return _LazyLoop(self, make_frame, fps, frame_count, seam_count, data_path, meta_path,
+                         shape, meta)
+
+    def _fresh(self, meta_path, make_frame, frame_shape):
+        """Whether a stored loop still starts with the frame the kernel renders now"""
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return meta.get('first_frame') == _frame_digest(_first_frame(make_frame, frame_shape))
+
+    def _write_meta(self, meta_path, meta):
+        fd, temp_meta = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_meta, meta_path)
+
+    def _blend_seam(self, frames, make_frame, fps, frame_count, seam_count):
+        # Loop cut short of its true period: fade the frames just past the end
+        # of the loop into its first frames so the wrap-around is continuous.
+        for frame_num in range(seam_count):
+            weight = frame_num / seam_count
+            overrun = make_frame((frame_count + frame_num) / fps).astype(np.float32)
+            frames[frame_num] = np.rint(overrun * (1 - weight) + frames[frame_num] * weight).astype(np.uint8)
+
+    def _key(self, theme_key, make_frame, size, fps, frame_count, seam_count):
+        digest = hashlib.sha1()
+        digest.update(repr((CACHE_FORMAT_VERSION, theme_key, tuple(size), fps,
+                            frame_count, seam_count)).encode('utf-8'))
+        digest.update(_kernel_fingerprint(make_frame))
+        return f"{theme_key}_{size[0]}x{size[1]}_{fps}fps_{digest.hexdigest()[:16]}"
+
+background_cache = lazy_default(BackgroundCache, "The process-wide background loop cache")
+
+def cached_background(theme_key, make_frame, duration, size=(1080, 1920), fps=24, period=None):
+    """Serve a theme background from the shared on-disk loop cache"""
+    return background_cache().clip(theme_key, make_frame, duration, size, fps, period)
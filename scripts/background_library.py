@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Library of background videos pre-normalized for YouTube Shorts.
+
+generate_video.py used to open a random background, stretch every frame to
+1080x1920 with clip.resize for the whole render and loop it. Here each
+background is transcoded once: scaled to cover 1080x1920 and cropped to it
+(no stretching), resampled to the target fps, silent, with a keyframe every
+KEYFRAME_INTERVAL_SECONDS. A JSON catalog records every normalized file's
+duration, fps, size and keyframe times, keyed by the source's content hash
+so re-running the tool only transcodes new or changed sources. Renders pick
+from the catalog, preferring clips at least as long as the narration.
+
+Usage:
+    python background_library.py build [source_dir]   normalize new backgrounds
+    python background_library.py list                 show the catalog
+
+Configuration (environment):
+    BACKGROUND_VIDEOS_DIR     source backgrounds (storage/background_videos)
+    BACKGROUND_LIBRARY_DIR    normalized files and catalog.json
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from render_output import atomic_output
+
+CATALOG_FORMAT_VERSION = 1
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE_DIR = os.path.join(REPO_ROOT, 'storage', 'background_videos')
+DEFAULT_LIBRARY_DIR = os.path.join(REPO_ROOT, 'storage', 'background_library')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+TARGET_SIZE = (1080, 1920)
+TARGET_FPS = 30
+KEYFRAME_INTERVAL_SECONDS = 2
+
+def library_dir():
+    return os.environ.get('BACKGROUND_LIBRARY_DIR', DEFAULT_LIBRARY_DIR)
+
+def catalog_path():
+    return os.path.join(library_dir(), 'catalog.json')
+
+def source_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_catalog():
+    """Catalog entries keyed by normalized file name, empty if there is no catalog"""
+    try:
+        with open(catalog_path(), 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if catalog.get('version') != CATALOG_FORMAT_VERSION:
+        return {}
+    return catalog.get('entries', {})
+
+def save_catalog(entries):
+    os.makedirs(library_dir(), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=library_dir(), suffix='.json.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'version': CATALOG_FORMAT_VERSION, 'entries': entries}, f,
+                  ensure_ascii=False, indent=2)
+    os.replace(temp_path, catalog_path())
+
+def keyframe_times(path):
+    """Presentation times of the keyframes in `path`, decoding keyframes only"""
+    command = [get_setting('FFMPEG_BINARY'), '-hide_banner', '-skip_frame', 'nokey',
+               '-i', path, '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-']
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stderr
+    return [round(float(match), 3) for match in re.findall(r'pts_time:\s*([0-9.]+)', output)]
+
+def normalize(source, output_file, size=TARGET_SIZE, fps=TARGET_FPS):
+    """Transcode `source` to cover `size` (crop-to-fill) at `fps`, without audio"""
+    width, height = size
+    video_filter = (f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+                    f"crop={width}:{height},setsar=1,fps={fps}")
+    gop = str(KEYFRAME_INTERVAL_SECONDS * fps)
+    with atomic_output(output_file) as temp_output:
+        subprocess.run([
+            get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-i', source,
+            '-vf', video_filter, '-an',
+            '-c:v', 'libx264', '-preset', 'medium', '-crf', '18', '-pix_fmt', 'yuv420p',
+            '-g', gop, '-keyint_min', gop, '-sc_threshold', '0',
+            '-movflags', '+faststart', temp_output
+        ], check=True)
+
+def build_library(source_dir=None, size=TARGET_SIZE, fps=TARGET_FPS):
+    """Normalize every background in `source_dir` that is not in the catalog yet"""
+    source_dir = source_dir or os.environ.get('BACKGROUND_VIDEOS_DIR', DEFAULT_SOURCE_DIR)
+    entries = load_catalog()
+    known = {(entry['source_sha256'], tuple(entry['size']), entry['fps']) for entry in entries.values()}
+    sources = sorted(name for name in os.listdir(source_dir)
+                     if name.lower().endswith(VIDEO_EXTENSIONS))
+    print(f"📚 Background library: {len(sources)} sources in {source_dir}")
+
+    for name in sources:
+        source = os.path.join(source_dir, name)
+        digest = source_hash(source)
+        if (digest, tuple(size), fps) in known:
+            print(f"   ♻️ {name}: already normalized")
+            continue
+
+        file_name = f"{os.path.splitext(name)[0]}_{size[0]}x{size[1]}_{fps}fps_{digest[:10]}.mp4"
+        output_file = os.path.join(library_dir(), file_name)
+        print(f"   🎞️ {name}: normalizing to {size[0]}x{size[1]} at {fps} fps...")
+        start = time.time()
+        normalize(source, output_file, size, fps)
+        infos = ffmpeg_parse_infos(output_file)
+
+        entries[file_name] = {
+            'source': os.path.abspath(source),
+            'source_sha256': digest,
+            'size': list(size),
+            'fps': fps,
+            'duration': infos['duration'],
+            'frames': infos['video_nframes'],
+            'keyframes': keyframe_times(output_file),
+            'bytes': os.path.getsize(output_file),
+        }
+        save_catalog(entries)
+        print(f"   ✅ {name}: {infos['duration']:.1f}s in {time.time() - start:.1f}s")
+
+    return entries
+
+def choose_background(duration, size=TARGET_SIZE, fps=TARGET_FPS, rng=random):
+    """Path and catalog entry of a normalized background for `duration` seconds.
+
+    Clips at least `duration` long are picked at random so they never loop;
+    otherwise the longest clip is used, so it loops as few times as possible.
+    Returns (None, None) when the catalog has no clip of this size and fps.
+    """
+    candidates = [
+        (name, entry) for name, entry in sorted(load_catalog().items())
+        if tuple(entry['size']) == tuple(size) and entry['fps'] == fps
+        and os.path.exists(os.path.join(library_dir(), name))
+    ]
+    if not candidates:
+        return None, None
+
+    long_enough = [candidate for candidate in candidates if candidate[1]['duration'] >= duration]
+    if long_enough:
+        name, entry = rng.choice(long_enough)
+    else:
+        name, entry = max(candidates, key=lambda candidate: candidate[1]['duration'])
+    return os.path.join(library_dir(), name), entry
+
+def print_catalog():
+    entries = load_catalog()
+    print(f"📚 {len(entries)} backgrounds in {catalog_path()}")
+    for name, entry in sorted(entries.items()):
+        print(f"   {name}: {entry['duration']:.1f}s, {entry['fps']} fps, "
+              f"{len(entry['keyframes'])} keyframes")
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'build':
+        build_library(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif len(sys.argv) == 2 and sys.argv[1] == 'list':
+        print_catalog()
+    else:
+        print("Usage: python background_library.py build [source_dir]")
+        print("       python background_library.py list")
+        sys.exit(1)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Multithreaded rendering of one frame in horizontal bands.
+
+NumPy releases the GIL inside large elementwise operations and copies, so a
+frame split into horizontal bands can be filled by several threads at once.
+A BandRenderer wraps a theme layer from theme_layers: `prepare(t)` runs once
+per frame on the calling thread, then every band of the shared output image
+is filled by `render_band` on a thread pool that lives as long as the
+renderer, so no threads are started per frame. A forked worker process
+(see parallel_export) starts its own pool on first use. Output frames come
+from a FramePool and stay valid until `pool_size` more frames are made.
+
+Configuration (environment):
+    RENDER_THREADS    band threads, defaults to the core count minus the
+                      encoder threads
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from theme_layers import FramePool
+
+DEFAULT_ENCODER_THREADS = 2
+
+def default_render_threads(encoder_threads=DEFAULT_ENCODER_THREADS):
+    """Cores left for rendering once the encoder has its threads"""
+    configured = os.environ.get('RENDER_THREADS')
+    if configured:
+        return max(1, int(configured))
+    return max(1, (os.cpu_count() or 1) - (encoder_threads or 0))
+
+class BandRenderer:
+    """Fills whole frames of `layer` band by band on a persistent thread pool"""
+
+    def __init__(self, layer, threads=None, size=(1080, 1920), pool_size=3):
+        self.layer = layer
+        self.size = size
+        self.pool = FramePool(size, pool_size)
+        self.threads = max(1, threads if threads is not None else default_render_threads())
+
+        height = size[1]
+        band_count = min(self.threads, height)
+        edges = [height * band // band_count for band in range(band_count + 1)]
+        self.bands = list(zip(edges[:-1], edges[1:]))
+        self._pool = None
+        self._pool_pid = None
+
+    def _get_pool(self):
+        # Pool threads do not survive a fork, so each process needs its own
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.threads)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def make_frame(self, t):
+        state = self.layer.prepare(t)
+        img = self.pool.acquire()
+
+        if self.threads == 1:
+            self.layer.render_band(state, img, 0, self.size[1])
+            return img
+
+        futures = [
+            self._get_pool().submit(self.layer.render_band, state, img[y0:y1], y0, y1)
+            for y0, y1 in self.bands
+        ]
+        for future in futures:
+            future.result()
+        return img
+
+    def close(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=True)
+        self._pool = None
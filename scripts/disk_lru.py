@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Shared pieces of the on-disk caches.
+
+Every cache stores an entry as a data file next to a `<key>.json` metadata
+file, written last. Touching the metadata on a hit marks the entry as
+recently used, and evict() removes the entries whose metadata is oldest
+until a new one fits the cache's byte budget.
+"""
+import os
+import threading
+
+def evict(cache_dir, data_suffix, max_bytes, incoming_bytes):
+    """Drop least-recently-used entries until `incoming_bytes` fits in `max_bytes`"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        meta_path = os.path.join(cache_dir, name)
+        data_path = meta_path[:-len('.json')] + data_suffix
+        try:
+            entries.append((os.path.getmtime(meta_path), meta_path, data_path,
+                            os.path.getsize(data_path)))
+        except OSError:
+            continue
+
+    total_bytes = sum(entry[3] for entry in entries)
+    for _, meta_path, data_path, data_bytes in sorted(entries):
+        if total_bytes + incoming_bytes <= max_bytes:
+            break
+        for path in (meta_path, data_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        total_bytes -= data_bytes
+
+def lazy_default(factory, doc=None):
+    """An accessor for one process-wide `factory()` instance, created on first call"""
+    lock = threading.Lock()
+    instances = []
+
+    def default():
+        with lock:
+            if not instances:
+                instances.append(factory())
+            return instances[0]
+
+    default.__doc__ = doc
+    return default
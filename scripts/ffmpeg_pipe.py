@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Direct ffmpeg rawvideo output, bypassing moviepy's write_videofile.
+
+write_videofile pushes every frame through CompositeVideoClip, which copies
+the whole frame once per layer and converts dtypes along the way. Here the
+background frame is copied once into a reused uint8 buffer, overlays are
+blended in place by an OverlayCompositor over their bounding boxes only,
+and the buffer is written to ffmpeg's stdin as rawvideo through a
+memoryview. The narration is muxed by the same ffmpeg process, stream-copied
+from render_output's AAC cache, and the MP4 is renamed into place only once
+ffmpeg has finished it.
+
+Rendering and encoder feeding overlap: a producer thread renders frame N+1
+into one of a few preallocated buffers while the caller's thread writes
+frame N to ffmpeg, joined by a bounded queue.
+"""
+import math
+import queue
+import subprocess
+import threading
+import time
+
+import numpy as np
+from moviepy.config import get_setting
+
+from overlay_compositor import OverlayCompositor
+from render_output import aac_cache, atomic_output, job_scratch
+
+class FFmpegPipeWriter:
+    """ffmpeg process encoding rgb24 frames written to its stdin"""
+
+    def __init__(self, output_file, size, fps, codec='libx264', preset='medium',
+                 bitrate=None, audio_file=None, audio_codec='aac', threads=None,
+                 ffmpeg_params=None):
+        self.output_file = output_file
+        self.size = size
+
+        command = [
+            get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo',
+            '-s', f"{size[0]}x{size[1]}", '-pix_fmt', 'rgb24', '-r', str(fps),
+            '-i', '-',
+        ]
+        if audio_file:
+            command += ['-i', audio_file, '-map', '0:v:0', '-map', '1:a:0',
+                        '-c:a', audio_codec, '-shortest']
+        command += ['-c:v', codec, '-preset', preset, '-pix_fmt', 'yuv420p']
+        if bitrate:
+            command += ['-b:v', bitrate]
+        if threads:
+            command += ['-threads', str(threads)]
+        command += list(ffmpeg_params or [])
+        command.append(output_file)
+
+        # Unbuffered stdin: frames go straight from our buffer into the pipe
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                     bufsize=0)
+
+    def write_frame(self, frame):
+        if frame.dtype != np.uint8 or not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+        view = memoryview(frame).cast('B')
+        try:
+            while view:
+                written = self.proc.stdin.write(view)
+                view = view[written:]
+        except BrokenPipeError:
+            raise IOError(f"ffmpeg stopped while writing {self.output_file}: "
+                          f"{self.proc.stderr.read().decode('utf-8', 'replace')}")
+
+    def close(self):
+        if self.proc is None:
+            return
+        self.proc.stdin.close()
+        error = self.proc.stderr.read().decode('utf-8', 'replace')
+        returncode = self.proc.wait()
+        self.proc = None
+        if returncode != 0:
+            raise IOError(f"ffmpeg failed writing {self.output_file}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.proc is not None:
+            self.proc.kill()
+        self.close()
+
+def encode_frames(render_into, size, fps, first_frame, frame_count, writer, buffers=3):
+    """Render frames with `render_into(frame, t)` on a producer thread and feed `writer`.
+
+    `buffers` preallocated frames circulate between the two sides, so at most
+    that many frames are rendered ahead of the encoder. Returns run statistics.
+    """
+    buffers = max(2, buffers)
+    free_frames = queue.Queue()
+    for _ in range(buffers):
+        free_frames.put(np.empty((size[1], size[0], 3), dtype=np.uint8))
+    ready_frames = queue.Queue()
+    stop = threading.Event()
+    stats = {'frames': 0, 'buffers': buffers, 'render_stall': 0.0, 'encode_stall': 0.0}
+    queue_depths = []
+
+    def produce():
+        try:
+            for frame_num in range(first_frame, first_frame + frame_count):
+                wait_start = time.perf_counter()
+                frame = free_frames.get()
+                stats['render_stall'] += time.perf_counter() - wait_start
+                if frame is None or stop.is_set():
+                    return
+                render_into(frame, frame_num / fps)
+                ready_frames.put(frame)
+            ready_frames.put(None)
+        except BaseException as e:
+            ready_frames.put(e)
+
+    start = time.time()
+    producer = threading.Thread(target=produce, name='frame-producer', daemon=True)
+    producer.start()
+    try:
+        while True:
+            queue_depths.append(ready_frames.qsize())
+            wait_start = time.perf_counter()
+            frame = ready_frames.get()
+            stats['encode_stall'] += time.perf_counter() - wait_start
+            if frame is None:
+                break
+            if isinstance(frame, BaseException):
+                raise frame
+            writer.write_frame(frame)
+            stats['frames'] += 1
+            free_frames.put(frame)
+    finally:
+        stop.set()
+        free_frames.put(None)  # wake the producer if it waits for a buffer
+        producer.join()
+
+    elapsed = time.time() - start
+    stats['elapsed'] = elapsed
+    stats['fps'] = stats['frames'] / elapsed if elapsed > 0 else float('inf')
+    stats['mean_queue_depth'] = sum(queue_depths) / len(queue_depths) if queue_depths else 0.0
+    return stats
+
+def print_pipeline_stats(stats, label='Pipeline'):
+    print(f"   📊 {label}: {stats['frames']} frames at {stats['fps']:.1f} fps, "
+          f"{stats['buffers']} buffers (mean queue depth {stats['mean_queue_depth']:.1f}), "
+          f"render stalled {stats['render_stall']:.1f}s, encoder stalled {stats['encode_stall']:.1f}s")
+
+def write_video_pipe(clips, output_file, fps, duration, audio_file=None,
+                     codec='libx264', audio_codec='aac', preset='medium',
+                     bitrate=None, threads=None, buffers=3):
+    """Encode `clips` (full-frame background first, then overlays) through ffmpeg.
+
+    Frames match CompositeVideoClip(clips) to within one level. Returns
+    the pipeline statistics of the run.
+    """
+    compositor = OverlayCompositor(clips)
+    size = compositor.size
+    total_frames = int(math.ceil(duration * fps - 1e-9))
+
+    with job_scratch() as scratch, atomic_output(output_file) as temp_output:
+        audio = aac_cache().encoded(audio_file, scratch, audio_codec) if audio_file else None
+        with FFmpegPipeWriter(temp_output, size, fps, codec=codec, preset=preset, bitrate=bitrate,
+                              audio_file=audio, audio_codec='copy', threads=threads) as writer:
+            stats = encode_frames(compositor.render_into, size, fps, 0, total_frames, writer, buffers)
+
+    print_pipeline_stats(stats)
+    return stats
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import json
+import sys
+
+from audio_artifact import sidecar_path, write_artifact
+from tts_cache import synthesize_speech, tts_cache
+
+def generate_audio(config_file):
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        print(f"Generating audio with config: {config_file}")
+
+        language = config.get('language', 'ko')
+        speech = synthesize_speech(config['script_text'], lang=language, slow=config.get('slow', False))
+        print(f"✅ Audio {'loaded from TTS cache' if speech.cached else 'generated'} "
+              f"(duration: {speech.duration:.1f}s)")
+
+        max_duration = config.get('max_duration')
+        if max_duration and speech.duration > max_duration:
+            print(f"⚠️ Audio is longer than {max_duration}s; the video stage will trim it")
+
+        artifact = write_artifact(speech, config['output_file'], language=language)
+        speech.release()
+        tts_cache().print_stats()
+
+        print(f"✅ Audio generated successfully: {artifact.path}")
+        print(f"   📄 Sidecar: {sidecar_path(artifact.path)} "
+              f"({artifact.sample_rate} Hz, sha256 {artifact.sha256[:12]})")
+
+    except Exception as e:
+        print(f"❌ Error generating audio: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python generate_audio.py <config_file>")
+        sys.exit(1)
+
+    generate_audio(sys.argv[1])
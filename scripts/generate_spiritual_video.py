@@ -1,87 +1,141 @@
 #!/usr/bin/env python3
 import json
 import sys
-import os
 import random
+import time
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 
-# Configure ImageMagick path for moviepy
-os.environ['IMAGEMAGICK_BINARY'] = '/opt/homebrew/bin/convert'
+from background_cache import cached_background, loop_period
+from ffmpeg_pipe import write_video_pipe
+from overlay_cache import overlay_cache
+from overlay_compositor import composite_overlays
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from theme_layers import InPlaceBackground, RowConstantBackground, ScrollingBackground
+from tts_cache import synthesize_speech
 
-from moviepy.editor import *
-from gtts import gTTS
-import tempfile
+def make_spiritual_frame_function(theme, size=(1080, 1920)):
+    """Build the make_frame(t) kernel for a theme.
+
+    Every kernel works on whole-frame NumPy arrays; anything that does not
+    depend on `t` is computed once here instead of on every frame.
+    """
+    width, height = size
+    ys = np.arange(height)
+    xs = np.arange(width)
 
-def create_spiritual_background(theme, duration, size=(1080, 1920)):
-    """Create spiritual-themed background based on theme selection"""
-    
     if theme == "golden_light":
         # Golden gradient with light rays
-        def make_frame(t):
-            # Create golden gradient
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-            for y in range(size[1]):
-                intensity = int(255 * (0.3 + 0.4 * np.sin(y / size[1] * np.pi)))
-                golden_color = [intensity, int(intensity * 0.8), int(intensity * 0.3)]
-                img[y, :] = golden_color
-            
-            # Add subtle animation
-            wave = int(30 * np.sin(t * 0.5))
-            img = np.roll(img, wave, axis=0)
-            return img
-            
+        intensity = (255 * (0.3 + 0.4 * np.sin(ys / height * np.pi))).astype(np.int64)
+        golden_column = np.stack([
+            intensity,
+            (intensity * 0.8).astype(np.int64),
+            (intensity * 0.3).astype(np.int64)
+        ], axis=1).astype(np.uint8)
+
+        # Add subtle animation: the static gradient scrolls up and down
+        make_frame = ScrollingBackground(
+            golden_column[:, np.newaxis, :],
+            lambda t: int(30 * np.sin(t * 0.5)),
+            axis=0,
+            size=size
+        ).make_frame
+
     elif theme == "peaceful_blue":
         # Peaceful blue with flowing patterns
-        def make_frame(t):
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-            for y in range(size[1]):
-                for x in range(size[0]):
-                    # Create flowing blue pattern
-                    wave1 = np.sin((x + t * 50) / 100) * 0.3
-                    wave2 = np.cos((y + t * 30) / 150) * 0.2
-                    intensity = int(100 + 80 * (wave1 + wave2))
-                    img[y, x] = [20, 50, intensity]
-            return img
-            
+        blue_wave = np.empty((height, width))  # reused float scratch
+
+        def render_frame(img, t):
+            # Flowing blue pattern: one wave along x, one along y
+            wave1 = np.sin((xs + t * 50) / 100) * 0.3
+            wave2 = np.cos((ys + t * 30) / 150) * 0.2
+            np.add(wave1[np.newaxis, :], wave2[:, np.newaxis], out=blue_wave)
+            np.multiply(blue_wave, 80, out=blue_wave)
+            np.add(blue_wave, 100, out=blue_wave)
+            img[:, :, 0] = 20
+            img[:, :, 1] = 50
+            np.copyto(img[:, :, 2], blue_wave, casting='unsafe')
+
+        make_frame = InPlaceBackground(render_frame, size).make_frame
+
     elif theme == "sunset_worship":
-        # Warm sunset colors for worship
-        def make_frame(t):
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-            for y in range(size[1]):
-                # Sunset gradient from orange to purple
-                ratio = y / size[1]
-                r = int(255 * (1 - ratio * 0.7))
-                g = int(150 * (1 - ratio))
-                b = int(100 + 155 * ratio)
-                img[y, :] = [r, g, b]
-            
-            # Add gentle movement
-            shift = int(10 * np.sin(t * 0.3))
-            img = np.roll(img, shift, axis=1)
-            return img
-            
+        # Sunset gradient from orange to purple
+        ratio = ys / height
+        sunset_column = np.stack([
+            (255 * (1 - ratio * 0.7)).astype(np.int64),
+            (150 * (1 - ratio)).astype(np.int64),
+            (100 + 155 * ratio).astype(np.int64)
+        ], axis=1).astype(np.uint8)
+
+        # Every row is a single colour, so the old horizontal np.roll "movement"
+        # never changed a pixel; the frame is static.
+        make_frame = RowConstantBackground(lambda t: sunset_column, size).make_frame
+
     else:  # "cross_pattern" default
         # Subtle cross pattern with soft lighting
-        def make_frame(t):
-            img = np.full((size[1], size[0], 3), [40, 60, 100], dtype=np.uint8)
-            
-            # Add subtle cross pattern
-            center_x, center_y = size[0] // 2, size[1] // 2
-            cross_width = 80
+        base_color = np.array([40, 60, 100])
+        light_color = np.array([200, 200, 255])
+        center_x, center_y = width // 2, height // 2
+        cross_width = 80
+        x1, x2 = center_x - cross_width // 2, center_x + cross_width // 2
+        y1, y2 = center_y - cross_width // 2, center_y + cross_width // 2
+
+        def render_frame(img, t):
             cross_alpha = 0.3 + 0.2 * np.sin(t * 0.5)
-            
-            # Vertical line of cross
-            x1, x2 = center_x - cross_width // 2, center_x + cross_width // 2
-            img[:, x1:x2] = img[:, x1:x2] * (1 - cross_alpha) + np.array([200, 200, 255]) * cross_alpha
-            
-            # Horizontal line of cross
-            y1, y2 = center_y - cross_width // 2, center_y + cross_width // 2
-            img[y1:y2, :] = img[y1:y2, :] * (1 - cross_alpha) + np.array([200, 200, 255]) * cross_alpha
-            
-            return img.astype(np.uint8)
-    
-    return VideoClip(make_frame, duration=duration)
+
+            # Each bar is one flat colour; where they overlap the blend is applied twice
+            bar_color = (base_color * (1 - cross_alpha) + light_color * cross_alpha).astype(np.uint8)
+            overlap_color = (bar_color * (1 - cross_alpha) + light_color * cross_alpha).astype(np.uint8)
+
+            img[:] = base_color
+            img[:, x1:x2] = bar_color
+            img[y1:y2, :] = bar_color
+            img[y1:y2, x1:x2] = overlap_color
+
+        make_frame = InPlaceBackground(render_frame, size).make_frame
+
+    return make_frame
+
+# Angular frequencies (rad/s) each theme animates with, for loop caching
+SPIRITUAL_THEME_PERIODS = {
+    "golden_light": loop_period(0.5),
+    "peaceful_blue": loop_period(50 / 100, 30 / 150),
+    "sunset_worship": loop_period(),
+    "cross_pattern": loop_period(0.5),
+}
+
+def create_spiritual_background(theme, duration, size=(1080, 1920), fps=30):
+    """Create spiritual-themed background based on theme selection"""
+    theme_key = theme if theme in SPIRITUAL_THEME_PERIODS else "cross_pattern"
+    return cached_background(
+        theme_key,
+        make_spiritual_frame_function(theme, size),
+        duration,
+        size,
+        fps,
+        period=SPIRITUAL_THEME_PERIODS[theme_key]
+    )
+
+def benchmark_spiritual_themes(frame_count=30, size=(1080, 1920), target_fps=30):
+    """Render `frame_count` frames of every theme and report frames per second"""
+    themes = ["golden_light", "peaceful_blue", "sunset_worship", "cross_pattern"]
+    results = {}
+
+    print(f"⏱️ Benchmarking background kernels at {size[0]}x{size[1]} ({frame_count} frames each)")
+    for theme in themes:
+        make_frame = make_spiritual_frame_function(theme, size)
+        start = time.perf_counter()
+        for frame_num in range(frame_count):
+            make_frame(frame_num / target_fps)
+        elapsed = time.perf_counter() - start
+
+        fps = frame_count / elapsed if elapsed > 0 else float('inf')
+        results[theme] = fps
+        status = "✅ real-time" if fps >= target_fps else "⚠️ slower than real-time"
+        print(f"   {theme:<16} {fps:8.1f} fps  {status} (target {target_fps} fps)")
+
+    return results
 
 def create_enhanced_text_overlay(text, theme, position, duration, size=(1080, 1920)):
     """Create enhanced text overlay with spiritual styling"""
@@ -111,8 +165,11 @@ def create_enhanced_text_overlay(text, theme, position, duration, size=(1080, 19
         stroke_width = 4
         font_size = 56
     
+    if not text.strip():
+        return None
+    
     # Create text clip with enhanced styling
-    txt_clip = TextClip(
+    txt_clip = text_clip(
         text,
         fontsize=font_size,
         color=font_color,
@@ -138,6 +195,9 @@ def add_bible_verse_styling(scripture_text, theme, duration):
     clips = []
     
     for i, line in enumerate(lines):
+        if not line.strip():
+            continue  # blank lines keep their slot but draw nothing
+        
         if i == 0:  # First line (usually scripture reference)
             position = ('center', 250)
             font_size = 48
@@ -161,7 +221,7 @@ def add_bible_verse_styling(scripture_text, theme, duration):
             font_color = '#E6E6FA' if i == 0 else '#F0F0FF'
             stroke_color = '#000080'
         
-        txt_clip = TextClip(
+        txt_clip = text_clip(
             line,
             fontsize=font_size,
             color=font_color,
@@ -185,6 +245,7 @@ def generate_spiritual_video(config_file):
             config = json.load(f)
         
         print(f"🎬 Generating spiritual video with config: {config_file}")
+        check_fonts()  # fail before synthesizing any audio
         
         # Select theme (can be specified in config or random)
         themes = ["golden_light", "peaceful_blue", "sunset_worship", "cross_pattern"]
@@ -192,16 +253,11 @@ def generate_spiritual_video(config_file):
         print(f"🎨 Using theme: {theme}")
         
         # Generate audio from script
-        tts = gTTS(text=config['script_text'], lang='ko', slow=False)
-        audio_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-        tts.save(audio_file.name)
-        print("✅ Korean audio generated")
+        speech = synthesize_speech(config['script_text'], lang='ko', slow=False)
+        print(f"✅ Korean audio {'loaded from TTS cache' if speech.cached else 'generated'}")
         
-        # Load audio
-        audio = AudioFileClip(audio_file.name)
-        duration = min(audio.duration, 300)  # Max 5 minutes
-        audio = audio.set_duration(duration)
-        print(f"✅ Audio loaded (duration: {duration}s)")
+        duration = min(speech.duration, 300)  # Max 5 minutes
+        print(f"✅ Audio duration: {duration}s")
         
         # Create spiritual background
         background = create_spiritual_background(theme, duration)
@@ -219,7 +275,7 @@ def generate_spiritual_video(config_file):
         # Add channel branding (optional)
         if config.get('add_branding', True):
             branding_text = "진리의 말씀 | BibleStartup"
-            branding_clip = TextClip(
+            branding_clip = text_clip(
                 branding_text,
                 fontsize=32,
                 color='#FFFFFF',
@@ -229,30 +285,39 @@ def generate_spiritual_video(config_file):
             ).set_position(('center', 1800)).set_duration(duration).crossfadein(1.0)
             all_clips.append(branding_clip)
             print("✅ Channel branding added")
+        overlay_cache().print_stats()
         
         # Combine all clips
-        final_video = CompositeVideoClip(all_clips)
-        
-        # Set audio
-        final_video = final_video.set_audio(audio)
-        print("✅ Audio attached to spiritual video")
+        final_video = composite_overlays(all_clips)
         
         # Export video with high quality settings
-        print("🎬 Rendering spiritual video...")
-        final_video.write_videofile(
-            config['output_file'],
-            fps=30,
-            codec='libx264',
-            audio_codec='aac',
-            bitrate='8000k',  # Higher bitrate for better quality
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            verbose=False,
-            logger=None
-        )
-        
-        # Cleanup
-        os.unlink(audio_file.name)
+        output_backend = config.get('output_backend', 'moviepy')  # or 'ffmpeg_pipe'
+        print(f"🎬 Rendering spiritual video ({output_backend} backend)...")
+        render_start = time.time()
+        if output_backend == 'ffmpeg_pipe':
+            write_video_pipe(
+                all_clips,
+                config['output_file'],
+                fps=30,
+                duration=duration,
+                audio_file=speech.path,
+                codec='libx264',
+                audio_codec='aac',
+                bitrate='8000k',
+                buffers=config.get('pipeline_buffers', 3)
+            )
+        else:
+            write_videofile_muxed(
+                final_video,
+                config['output_file'],
+                fps=30,
+                audio_file=speech.path,
+                codec='libx264',
+                audio_codec='aac',
+                bitrate='8000k',  # Higher bitrate for better quality
+            )
+        print(f"✅ Rendered in {time.time() - render_start:.1f}s")
+        speech.release()
         
         print(f"✅ Spiritual video generated successfully: {config['output_file']}")
         print(f"🎨 Theme used: {theme}")
@@ -262,8 +327,13 @@ def generate_spiritual_video(config_file):
         sys.exit(1)
 
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--benchmark":
+        benchmark_spiritual_themes(int(sys.argv[2]) if len(sys.argv) > 2 else 30)
+        sys.exit(0)
+
     if len(sys.argv) != 2:
         print("Usage: python generate_spiritual_video.py <config_file>")
+        print("       python generate_spiritual_video.py --benchmark [frame_count]")
         sys.exit(1)
     
     generate_spiritual_video(sys.argv[1])
\ No newline at end of file
@@ -6,118 +6,232 @@ import random
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 
-# Configure ImageMagick path for moviepy
-os.environ['IMAGEMAGICK_BINARY'] = '/opt/homebrew/bin/convert'
-
 from moviepy.editor import *
-from gtts import gTTS
-import tempfile
+from collections import OrderedDict
 
-def create_optimized_spiritual_background(theme, duration, size=(1080, 1920)):
-    """Create optimized spiritual-themed background with pre-computed frames"""
-    
-    # Pre-compute background frames for better performance
-    fps = 12  # Reduced from default 24fps for faster processing
-    total_frames = int(duration * fps)
-    
-    print(f"Pre-computing {total_frames} frames for {theme} theme...")
-    
-    frames = []
-    
-    for frame_num in range(total_frames):
-        t = frame_num / fps
+from band_renderer import BandRenderer, DEFAULT_ENCODER_THREADS, default_render_threads
+from ffmpeg_pipe import write_video_pipe
+from keyframes import DEFAULT_MOTION_BUDGET, KeyframeBackground
+from overlay_cache import overlay_cache
+from overlay_compositor import composite_overlays
+from palettes import ThresholdPalette
+from parallel_export import default_render_workers, write_videofile_parallel
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from theme_layers import BandedBackground, RowConstantBackground, ScrollingBackground
+from tts_cache import synthesize_speech, tts_cache
+
+class StreamingFrameSource:
+    """On-demand background frames with a small bounded window.
+
+    Frames come from a generator that renders them in timeline order, so
+    memory stays flat however long the clip is. moviepy may ask for the same
+    `t` more than once (or step back slightly), which is served from the
+    window; larger jumps restart the generator at the requested frame.
+    """
+
+    def __init__(self, render_frame, fps, total_frames, window=4):
+        self.render_frame = render_frame
+        self.fps = fps
+        self.total_frames = max(1, total_frames)
+        self.window = max(1, window)
+        self._window = OrderedDict()
+        self._generator = None
+        self._next_index = 0
+
+    def _frame_generator(self, start_index):
+        for frame_num in range(start_index, self.total_frames):
+            yield frame_num, self.render_frame(frame_num / self.fps)
+
+    def get_frame(self, t):
+        frame_index = min(max(int(t * self.fps), 0), self.total_frames - 1)
+
+        if frame_index in self._window:
+            return self._window[frame_index]
+
+        if (self._generator is None or frame_index < self._next_index
+                or frame_index - self._next_index > self.window):
+            self._generator = self._frame_generator(frame_index)
+
+        for rendered_index, frame in self._generator:
+            self._next_index = rendered_index + 1
+            self._window[rendered_index] = frame
+            if len(self._window) > self.window:
+                self._window.popitem(last=False)
+            if rendered_index == frame_index:
+                return frame
+
+        # Generator ran past the end of the clip; render directly
+        self._generator = None
+        return self.render_frame(frame_index / self.fps)
+
+SUNSET_WORSHIP_PALETTE = ThresholdPalette([
+    (0.3, lambda wave: (255, 165 + wave, 50 + wave//2)),                # Top - orange
+    (0.7, lambda wave: (255, 100 + wave, 30 + wave//3)),                # Middle - red
+    (None, lambda wave: (150 + wave//2, 50 + wave//3, 100 + wave)),     # Bottom - purple
+])
+
+def make_optimized_theme_layer(theme, size=(1080, 1920), pool_size=3):
+    """Build the background layer for `theme`.
+
+    Row-constant themes produce a single column of colours per frame and
+    their make_frame returns a broadcast view of it instead of a full image.
+    Every layer can also render horizontal bands for a BandRenderer.
+    """
+    
+    if theme == "golden_light":
+        # Vectorized gradient computation
+        y_indices = np.arange(size[1])
+        intensities = (255 * (0.3 + 0.4 * np.sin(y_indices / size[1] * np.pi))).astype(np.uint8)
         
-        if theme == "golden_light":
-            # Optimized golden gradient
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-            
-            # Vectorized gradient computation
-            y_indices = np.arange(size[1])
-            intensities = (255 * (0.3 + 0.4 * np.sin(y_indices / size[1] * np.pi))).astype(np.uint8)
-            
-            # Create golden color array
-            img[:, :, 0] = intensities.reshape(-1, 1)  # Red
-            img[:, :, 1] = (intensities * 0.8).astype(np.uint8).reshape(-1, 1)  # Green
-            img[:, :, 2] = (intensities * 0.3).astype(np.uint8).reshape(-1, 1)  # Blue
-            
-            # Simple wave animation
-            wave = int(20 * np.sin(t * 0.5))
-            img = np.roll(img, wave, axis=0)
-            
-        elif theme == "peaceful_blue":
-            # Optimized peaceful blue
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-            
-            # Simple gradient with minimal computation
-            base_intensity = 80 + int(40 * np.sin(t * 0.3))
-            for y in range(0, size[1], 20):  # Skip pixels for speed
-                for x in range(0, size[0], 20):
-                    wave = int(30 * np.sin((x + y + t * 50) / 200))
-                    intensity = max(20, min(255, base_intensity + wave))
-                    
-                    # Fill 20x20 block for speed
-                    y_end = min(y + 20, size[1])
-                    x_end = min(x + 20, size[0])
-                    img[y:y_end, x:x_end] = [10, 30, intensity]
-            
-        elif theme == "sunset_worship":
-            # Optimized sunset colors
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        # Create golden color column
+        golden_column = np.stack([
+            intensities,  # Red
+            (intensities * 0.8).astype(np.uint8),  # Green
+            (intensities * 0.3).astype(np.uint8)  # Blue
+        ], axis=1)
+        
+        # Simple wave animation
+        return ScrollingBackground(
+            golden_column[:, np.newaxis, :],
+            lambda t: int(20 * np.sin(t * 0.5)),
+            axis=0,
+            size=size
+        )
+        
+    elif theme == "peaceful_blue":
+        # Optimized peaceful blue: flat 20x20 blocks, one wave value per block
+        block_xs = np.arange(0, size[0], 20)
+        block_of_x = np.arange(size[0]) // 20
+        
+        def peaceful_state(t):
+            return t, 80 + int(40 * np.sin(t * 0.3))
+        
+        def render_peaceful_band(state, band, y0, y1):
+            t, base_intensity = state
+            first_block = y0 // 20
+            block_ys = np.arange(first_block * 20, y1, 20)
+            wave = (30 * np.sin((block_ys[:, np.newaxis] + block_xs[np.newaxis, :] + t * 50) / 200)).astype(np.int64)
+            intensity = np.clip(base_intensity + wave, 20, 255)
             
-            # Simple vertical gradient
-            for y in range(size[1]):
-                gradient_pos = y / size[1]
-                wave = int(15 * np.sin(t * 0.4 + y / 100))
-                
-                if gradient_pos < 0.3:  # Top - orange
-                    color = [255, 165 + wave, 50 + wave//2]
-                elif gradient_pos < 0.7:  # Middle - red
-                    color = [255, 100 + wave, 30 + wave//3]
-                else:  # Bottom - purple
-                    color = [150 + wave//2, 50 + wave//3, 100 + wave]
-                
-                img[y, :] = [max(0, min(255, c)) for c in color]
-                
-        elif theme == "cross_pattern":
-            # Optimized cross pattern
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+            block_of_y = np.arange(y0, y1) // 20 - first_block
+            band[:, :, 0] = 10
+            band[:, :, 1] = 30
+            band[:, :, 2] = intensity[block_of_y[:, np.newaxis], block_of_x[np.newaxis, :]]
+        
+        return BandedBackground(peaceful_state, render_peaceful_band, size, pool_size)
+        
+    elif theme == "sunset_worship":
+        # Simple vertical gradient, one colour per row
+        rows = np.arange(size[1])
+        sunset_bands = SUNSET_WORSHIP_PALETTE.band_index(rows / size[1])
+        sunset_colours = SUNSET_WORSHIP_PALETTE.lookup_table(-15, 15)
+        
+        def sunset_column(t):
+            wave = (15 * np.sin(t * 0.4 + rows / 100)).astype(np.int64)
+            return sunset_colours(sunset_bands, wave)
+        
+        return RowConstantBackground(sunset_column, size)
             
+    elif theme == "cross_pattern":
+        center_x, center_y = size[0] // 2, size[1] // 2
+        cross_width = 80
+        
+        def cross_state(t):
             # Simple golden base
             base_color = int(120 + 30 * np.sin(t * 0.5))
-            img[:, :] = [base_color, int(base_color * 0.8), int(base_color * 0.4)]
-            
-            # Simple cross
-            center_x, center_y = size[0] // 2, size[1] // 2
-            cross_width = 80
+            return [base_color, int(base_color * 0.8), int(base_color * 0.4)]
+        
+        def render_cross_band(base_color, band, y0, y1):
+            # Optimized cross pattern
+            band[:, :] = base_color
             
             # Vertical bar
-            img[:, center_x-cross_width//2:center_x+cross_width//2] = [255, 255, 220]
-            # Horizontal bar  
-            img[center_y-cross_width//2:center_y+cross_width//2, :] = [255, 255, 220]
+            band[:, center_x-cross_width//2:center_x+cross_width//2] = [255, 255, 220]
+            # Horizontal bar, where it crosses this band
+            bar_y0 = max(center_y - cross_width//2, y0)
+            bar_y1 = min(center_y + cross_width//2, y1)
+            if bar_y0 < bar_y1:
+                band[bar_y0 - y0:bar_y1 - y0, :] = [255, 255, 220]
         
-        else:
-            # Default theme - simple gradient
-            img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
-            for y in range(size[1]):
-                intensity = int(150 + 50 * np.sin(y / size[1] * np.pi + t))
-                img[y, :] = [intensity, intensity, intensity]
-        
-        frames.append(img)
+        return BandedBackground(cross_state, render_cross_band, size, pool_size)
+    
+    # Default theme - simple gradient
+    y_angles = np.arange(size[1]) / size[1] * np.pi
+    
+    def default_column(t):
+        intensity = (150 + 50 * np.sin(y_angles + t)).astype(np.uint8)
+        return np.repeat(intensity[:, np.newaxis], 3, axis=1)
+    
+    return RowConstantBackground(default_column, size)
+
+# Motion budget: keyframes per second each theme needs when interpolated.
+# None renders every frame, for themes already cheaper than a blend.
+THEME_MOTION_BUDGETS = {
+    "golden_light": None, # scrolled views of a static base cost nothing
+    "peaceful_blue": 4,   # waves drift 50 px/s
+    "sunset_worship": 2,  # sin(t * 0.4) shimmer
+    "cross_pattern": 2,   # sin(t * 0.5) pulse
+}
+
+KEYFRAME_OUTPUT_FPS = 30
+
+def make_optimized_frame_function(theme, size=(1080, 1920), render_threads=1, pool_size=3,
+                                  keyframe_fps=None):
+    """Build the make_frame(t) kernel for `theme`.
+
+    With more than one render thread every frame is filled in horizontal
+    bands on a persistent thread pool. Only BandedBackground layers are
+    banded; row-constant and scrolling layers return a zero-copy broadcast
+    view, which banding would copy into a full frame. Full frames are drawn
+    into a pool of `pool_size` reused buffers. With `keyframe_fps` the theme
+    is rendered only at that rate and blended in between.
+    """
+    layer = make_optimized_theme_layer(theme, size, pool_size)
+    make_frame = layer.make_frame
+    if render_threads > 1 and isinstance(layer, BandedBackground):
+        make_frame = BandRenderer(layer, render_threads, size, pool_size).make_frame
+    if keyframe_fps:
+        make_frame = KeyframeBackground(layer, keyframe_fps, size, make_frame, pool_size).make_frame
+    return make_frame
+
+def create_optimized_spiritual_background(theme, duration, size=(1080, 1920), frame_window=4,
+                                          render_threads=1, keyframes=False):
+    """Create optimized spiritual-themed background streamed frame by frame.
+
+    With `keyframes`, output is smooth 30fps built from keyframes rendered
+    at the theme's motion budget; otherwise every frame is rendered at 12fps.
+    """
     
-    print(f"✅ Pre-computed {len(frames)} frames")
+    if keyframes:
+        fps = KEYFRAME_OUTPUT_FPS
+        keyframe_fps = THEME_MOTION_BUDGETS.get(theme, DEFAULT_MOTION_BUDGET)
+    else:
+        fps = 12  # Reduced from default 24fps for faster processing
+        keyframe_fps = None
+    total_frames = int(duration * fps)
     
-    # Create video from pre-computed frames
-    def make_frame(t):
-        frame_index = min(int(t * fps), len(frames) - 1)
-        return frames[frame_index]
+    print(f"Streaming {total_frames} frames for {theme} theme "
+          f"(window of {frame_window}, {render_threads} render threads"
+          + (f", {keyframe_fps} keyframes/s" if keyframe_fps else "") + ")...")
+    
+    # The window keeps recent frames, so the buffer pool must outlast it
+    source = StreamingFrameSource(
+        make_optimized_frame_function(theme, size, render_threads, pool_size=frame_window + 2,
+                                      keyframe_fps=keyframe_fps),
+        fps,
+        total_frames,
+        window=frame_window
+    )
     
-    return VideoClip(make_frame, duration=duration).set_fps(fps)
+    return VideoClip(source.get_frame, duration=duration).set_fps(fps)
 
 def generate_optimized_video(config_file):
     """Generate spiritual video with optimizations"""
     
     print("🚀 OPTIMIZED SPIRITUAL VIDEO GENERATOR")
     print("=" * 50)
+    check_fonts()  # fail before synthesizing any audio
     
     # Load configuration
     with open(config_file, 'r', encoding='utf-8') as f:
@@ -128,10 +242,20 @@ def generate_optimized_video(config_file):
     theme = config.get('theme', 'golden_light')
     output_file = config.get('output_file', 'output.mp4')
     add_branding = config.get('add_branding', True)
+    encoder_threads = config.get('encoder_threads', DEFAULT_ENCODER_THREADS)
+    render_workers = config.get('render_workers', default_render_workers())
+    output_backend = config.get('output_backend', 'moviepy')  # or 'ffmpeg_pipe'
+    pipeline_buffers = config.get('pipeline_buffers', 3)
+    keyframes = config.get('keyframe_interpolation', False)
+    output_fps = KEYFRAME_OUTPUT_FPS if keyframes else 12
+    # Parallel workers share the cores left over by the encoder
+    render_threads = config.get('render_threads',
+                                max(1, default_render_threads(encoder_threads) // render_workers))
     
     print(f"📝 Script: {len(script_text)} characters")
     print(f"🎨 Theme: {theme}")
     print(f"📁 Output: {output_file}")
+    print(f"🎞️ Output backend: {output_backend}")
     
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -140,21 +264,23 @@ def generate_optimized_video(config_file):
     print("🎤 Generating Korean TTS...")
     tts_start = time.time()
     
-    tts = gTTS(text=script_text, lang='ko', slow=False)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_audio:
-        tts.save(temp_audio.name)
-        audio_clip = AudioFileClip(temp_audio.name)
-        duration = audio_clip.duration
+    speech = synthesize_speech(script_text, lang='ko', slow=False)
+    duration = speech.duration
     
     tts_time = time.time() - tts_start
-    print(f"   ✅ TTS generated in {tts_time:.1f}s, duration: {duration:.1f}s")
+    tts_source = 'cache hit' if speech.cached else 'cache miss'
+    print(f"   ✅ TTS generated in {tts_time:.1f}s ({tts_source}), duration: {duration:.1f}s")
     
     # Create optimized background
     print("🎨 Creating optimized background...")
     bg_start = time.time()
     
-    background = create_optimized_spiritual_background(theme, duration)
+    background = create_optimized_spiritual_background(
+        theme, duration,
+        frame_window=config.get('frame_window', 4),
+        render_threads=render_threads,
+        keyframes=keyframes
+    )
     
     bg_time = time.time() - bg_start
     print(f"   ✅ Background created in {bg_time:.1f}s")
@@ -172,19 +298,21 @@ def generate_optimized_video(config_file):
         main_title = scripture_text
         subtitle = ""
     
-    title_clip = TextClip(
-        main_title,
-        fontsize=58,
-        color='white',
-        font='Arial-Bold',
-        stroke_color='black',
-        stroke_width=2
-    ).set_position(('center', 300)).set_duration(duration)
-    
-    clips = [background, title_clip]
-    
-    if subtitle:
-        subtitle_clip = TextClip(
+    clips = [background]
+    
+    if main_title.strip():
+        title_clip = text_clip(
+            main_title,
+            fontsize=58,
+            color='white',
+            font='Arial-Bold',
+            stroke_color='black',
+            stroke_width=2
+        ).set_position(('center', 300)).set_duration(duration)
+        clips.append(title_clip)
+    
+    if subtitle.strip():
+        subtitle_clip = text_clip(
             subtitle,
             fontsize=40,
             color='lightyellow',
@@ -196,39 +324,68 @@ def generate_optimized_video(config_file):
     
     text_time = time.time() - text_start
     print(f"   ✅ Text overlays created in {text_time:.1f}s")
+    overlay_cache().print_stats()
     
     # Compose and export with optimized settings
     print("🎬 Composing and exporting...")
     export_start = time.time()
     
-    final_video = CompositeVideoClip(clips).set_audio(audio_clip)
+    final_video = composite_overlays(clips)
     
     # Optimized export settings for speed
-    final_video.write_videofile(
-        output_file,
-        fps=12,  # Reduced FPS for speed
-        codec='libx264',
-        audio_codec='aac',
-        preset='ultrafast',  # Fastest encoding preset
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        verbose=False,
-        logger=None,
-        bitrate='1000k'  # Lower bitrate for speed
-    )
+    if output_backend == 'ffmpeg_pipe' and render_workers <= 1:
+        write_video_pipe(
+            clips,
+            output_file,
+            fps=output_fps,
+            duration=duration,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac',
+            preset='ultrafast',
+            bitrate='1000k',
+            threads=encoder_threads,
+            buffers=pipeline_buffers
+        )
+    elif render_workers > 1:
+        write_videofile_parallel(
+            final_video,
+            output_file,
+            fps=output_fps,
+            workers=render_workers,
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac',
+            preset='ultrafast',
+            bitrate='1000k',
+            threads=encoder_threads,
+            buffers=pipeline_buffers
+        )
+    else:
+        write_videofile_muxed(
+            final_video,
+            output_file,
+            fps=output_fps,  # 12fps, or 30fps from interpolated keyframes
+            audio_file=speech.path,
+            codec='libx264',
+            audio_codec='aac',
+            preset='ultrafast',  # Fastest encoding preset
+            threads=encoder_threads,
+            bitrate='1000k'  # Lower bitrate for speed
+        )
     
     export_time = time.time() - export_start
     total_time = tts_time + bg_time + text_time + export_time
     
     # Cleanup
     final_video.close()
-    audio_clip.close()
-    os.unlink(temp_audio.name)
+    speech.release()
     
     file_size = os.path.getsize(output_file) / 1024 / 1024
     
     print("\n🎯 PERFORMANCE SUMMARY:")
-    print(f"   TTS Generation: {tts_time:.1f}s")
+    print(f"   TTS Generation: {tts_time:.1f}s ({tts_source})")
+    tts_cache().print_stats()
     print(f"   Background Creation: {bg_time:.1f}s") 
     print(f"   Text Overlays: {text_time:.1f}s")
     print(f"   Video Export: {export_time:.1f}s")
@@ -2,12 +2,27 @@
 import json
 import sys
 import os
-# Configure ImageMagick path for moviepy
-os.environ['IMAGEMAGICK_BINARY'] = '/opt/homebrew/bin/convert'
 
 from moviepy.editor import *
-from gtts import gTTS
-import tempfile
+
+from audio_artifact import load_artifact
+from background_library import choose_background
+from loop_reader import LoopingBackground
+from overlay_compositor import composite_overlays
+from render_output import write_videofile_muxed
+from text_raster import check_fonts, text_clip
+from tts_cache import measure_duration, synthesize_speech
+
+def audio_file_duration(path):
+    """Duration of an audio file: from MP3 frame headers, or through ffmpeg for other formats"""
+    try:
+        return measure_duration(path)
+    except ValueError:
+        audio = AudioFileClip(path)
+        try:
+            return audio.duration
+        finally:
+            audio.close()
 
 def generate_video(config_file):
     try:
@@ -15,32 +30,46 @@ def generate_video(config_file):
             config = json.load(f)
         
         print(f"Generating video with config: {config_file}")
+        check_fonts()  # fail before synthesizing any audio
         
-        # Generate audio from script
-        tts = gTTS(text=config['script_text'], lang='ko', slow=False)
-        audio_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-        tts.save(audio_file.name)
-        print("✅ Audio generated")
-        
-        # Load background video
-        background = VideoFileClip(config['background_video'])
-        print("✅ Background video loaded")
-        
-        # Load audio
-        audio = AudioFileClip(audio_file.name)
-        print(f"✅ Audio loaded (duration: {audio.duration}s)")
+        # Use the audio stage's MP3; synthesize only when there is none
+        artifact = load_artifact(config['audio_file']) if config.get('audio_file') else None
+        speech = None
+        if artifact:
+            audio_path = artifact.path
+            print(f"✅ Audio artifact loaded: {audio_path}")
+        elif config.get('audio_file') and os.path.exists(config['audio_file']):
+            audio_path = config['audio_file']
+            print(f"⚠️ No valid sidecar for {audio_path}, using the MP3 as is")
+        elif config.get('script_text'):
+            speech = synthesize_speech(config['script_text'], lang='ko', slow=False)
+            audio_path = speech.path
+            print("✅ Audio generated from script text")
+        else:
+            raise ValueError("config needs audio_file or script_text")
+        audio_duration = artifact.duration if artifact else audio_file_duration(audio_path)
+        print(f"✅ Audio duration: {audio_duration}s")
         
-        # Resize background to YouTube Shorts format (1080x1920)
-        background = background.resize((1080, 1920))
+        duration = min(audio_duration, 300)  # Max 5 minutes
+        fps = config.get('fps', 30)
         
-        # Set duration to match audio (or max 5 minutes)
-        duration = min(audio.duration, 300)  # Max 5 minutes
-        background = background.set_duration(duration).loop(duration=duration)
-        audio = audio.set_duration(duration)
+        # Load a pre-normalized background, long enough not to loop if possible
+        background_path, entry = choose_background(duration, fps=fps)
+        # Short clips loop from a decoded frame ring instead of seeking back
+        if background_path:
+            looping = LoopingBackground(background_path, duration)
+            print(f"✅ Background loaded from library: {os.path.basename(background_path)} "
+                  f"({entry['duration']:.1f}s)")
+        else:
+            # Not in the library: ffmpeg scales to YouTube Shorts format (1080x1920) while decoding
+            looping = LoopingBackground(config['background_video'], duration,
+                                        target_resolution=(1920, 1080))
+            print("✅ Background video loaded (not in library, scaled while decoding)")
+        background = looping.clip
         
         # Create text overlay for scripture
         if config.get('scripture_text'):
-            txt_clip = TextClip(
+            txt_clip = text_clip(
                 config['scripture_text'],
                 fontsize=50,
                 color='white',
@@ -52,30 +81,24 @@ def generate_video(config_file):
             ).set_position(('center', 200)).set_duration(duration)
             
             # Combine video with text overlay
-            final_video = CompositeVideoClip([background, txt_clip])
+            final_video = composite_overlays([background, txt_clip])
             print("✅ Text overlay added")
         else:
             final_video = background
         
-        # Set audio
-        final_video = final_video.set_audio(audio)
-        print("✅ Audio attached to video")
-        
         # Export video
         print("🎬 Rendering final video...")
-        final_video.write_videofile(
+        write_videofile_muxed(
+            final_video,
             config['output_file'],
-            fps=30,
+            fps=fps,
+            audio_file=audio_path,
             codec='libx264',
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            verbose=False,
-            logger=None
+            audio_codec='aac'
         )
-        
-        # Cleanup
-        os.unlink(audio_file.name)
+        looping.print_stats()
+        if speech:
+            speech.release()
         
         print(f"✅ Video generated successfully: {config['output_file']}")
         
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Keyframe rendering with temporal interpolation for slow themes.
+
+Theme motion is slow (sin(t * 0.3), sin(t * 0.5)), so evaluating a theme in
+full for every output frame is mostly wasted work. A KeyframeBackground
+renders true keyframes at the theme's motion budget - a few keyframes per
+second - and produces every output frame in between by blending its two
+neighbouring keyframes with integer weights. Separable layers blend their
+small column/row state and stay zero-copy broadcast views; full-frame themes
+blend whole frames in preallocated buffers.
+"""
+import numpy as np
+
+from theme_layers import InPlaceBackground
+
+DEFAULT_MOTION_BUDGET = 3  # keyframes per second
+
+def _blend_weight(t, keyframe_fps):
+    """(keyframe index, weight of the next keyframe out of 256) for time `t`"""
+    position = t * keyframe_fps
+    index = int(np.floor(position))
+    weight = int(round((position - index) * 256))
+    if weight == 256:
+        return index + 1, 0
+    return index, weight
+
+class KeyframeBackground(InPlaceBackground):
+    """Background rendered at `keyframe_fps` and interpolated in between.
+
+    `layer` is a theme layer; if it has state_frame() its prepared state is
+    interpolated, otherwise whole frames from `make_keyframe` (default
+    `layer.make_frame`) are blended.
+    """
+
+    def __init__(self, layer, keyframe_fps, size=(1080, 1920), make_keyframe=None, pool_size=3):
+        super().__init__(self._render_blended, size, pool_size)
+        self.layer = layer
+        self.keyframe_fps = keyframe_fps
+        self.make_keyframe = make_keyframe or layer.make_frame
+        self.separable = hasattr(layer, 'state_frame')
+        self._keyframes = {}
+        self._blend = None
+        self._scratch = None
+
+    def _keyframe(self, index, keep=None):
+        """Keyframe `index`, never evicting (or reusing the buffer of) keyframe `keep`"""
+        keyframe = self._keyframes.get(index)
+        if keyframe is not None:
+            return keyframe
+
+        # Keep two keyframes; the one furthest from this index makes room
+        evicted = None
+        if len(self._keyframes) >= 2:
+            candidates = [k for k in self._keyframes if k != keep]
+            evicted = self._keyframes.pop(max(candidates, key=lambda k: abs(k - index)))
+
+        t = index / self.keyframe_fps
+        if self.separable:
+            keyframe = np.array(self.layer.prepare(t), dtype=np.uint8)
+        else:
+            keyframe = evicted if evicted is not None else np.empty(
+                (self.size[1], self.size[0], 3), dtype=np.uint8)
+            np.copyto(keyframe, self.make_keyframe(t), casting='unsafe')
+
+        self._keyframes[index] = keyframe
+        return keyframe
+
+    def _blend_into(self, out, first, second, weight):
+        """out = round((first * (256 - weight) + second * weight) / 256) in uint16"""
+        if self._blend is None or self._blend.shape != first.shape:
+            self._blend = np.empty(first.shape, dtype=np.uint16)
+            self._scratch = np.empty(first.shape, dtype=np.uint16)
+        np.multiply(first, 256 - weight, out=self._blend, dtype=np.uint16)
+        np.multiply(second, weight, out=self._scratch, dtype=np.uint16)
+        np.add(self._blend, self._scratch, out=self._blend)
+        np.add(self._blend, 128, out=self._blend)
+        np.right_shift(self._blend, 8, out=self._blend)
+        np.copyto(out, self._blend, casting='unsafe')
+        return out
+
+    def _blended_state(self, t):
+        index, weight = _blend_weight(t, self.keyframe_fps)
+        first = self._keyframe(index)
+        if weight == 0:
+            return first
+        second = self._keyframe(index + 1, keep=index)
+        return self._blend_into(np.empty_like(first), first, second, weight)
+
+    def _render_blended(self, out, t):
+        if self.separable:
+            np.copyto(out, self.layer.state_frame(self._blended_state(t)))
+            return
+
+        index, weight = _blend_weight(t, self.keyframe_fps)
+        first = self._keyframe(index)
+        if weight == 0:
+            np.copyto(out, first)
+            return
+        self._blend_into(out, first, self._keyframe(index + 1, keep=index), weight)
+
+    def make_frame(self, t):
+        if self.separable:
+            return self.layer.state_frame(self._blended_state(t))
+        return super().make_frame(t)
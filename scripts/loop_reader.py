@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Loop-aware background reader.
+
+clip.loop(duration=...) maps every loop iteration back to the start of the
+clip, so moviepy's reader seeks backwards and decodes the H.264 stream again
+on each pass. Clips whose decoded frames fit under a size threshold are
+decoded once, sequentially, into a raw uint8 frame file that is
+memory-mapped back in, and every iteration is served from that ring of
+frames. The file lives in render_output's scratch root (a tmpfs works well)
+and is unlinked as soon as it is mapped, so it disappears with the process.
+Longer clips keep streaming through moviepy. Decode time is measured either
+way and reported, to help choose the threshold.
+
+Configuration (environment):
+    LOOP_CACHE_MAX_BYTES    largest decoded clip kept as a frame ring, 0 streams always
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from moviepy.editor import VideoClip, VideoFileClip
+
+from render_output import scratch_root
+
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GB, about 5 s of 1080x1920 frames at 30 fps
+
+def default_max_bytes():
+    return int(os.environ.get('LOOP_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+class LoopingBackground:
+    """A background clip of `duration` seconds, looping `path` when it is shorter"""
+
+    def __init__(self, path, duration, max_bytes=None, **clip_options):
+        self.path = path
+        self.source = VideoFileClip(path, audio=False, **clip_options)
+        self.fps = self.source.fps
+        self.decode_seconds = 0.0
+        self.frames = None
+
+        width, height = self.source.size
+        frame_count = int(round(self.source.duration * self.fps))
+        decoded_bytes = frame_count * width * height * 3
+        max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+
+        if self.source.duration >= duration:
+            self.mode = 'stream'
+            self.clip = self._timed(self.source).set_duration(duration)
+        elif decoded_bytes <= max_bytes:
+            self.mode = 'ring'
+            self._decode(frame_count)
+            self.clip = VideoClip(self._ring_frame, duration=duration)
+        else:
+            self.mode = 'stream (loop)'
+            self.clip = self._timed(self.source).loop(duration=duration)
+        self.clip.fps = self.fps
+
+    def _decode(self, frame_count):
+        """Decode the clip once, front to back, into a memory-mapped frame ring"""
+        width, height = self.source.size
+        fd, ring_path = tempfile.mkstemp(prefix='loop_', suffix='.rgb', dir=scratch_root())
+        os.close(fd)
+        try:
+            frames = np.memmap(ring_path, dtype=np.uint8, mode='w+',
+                               shape=(max(1, frame_count), height, width, 3))
+        finally:
+            os.unlink(ring_path)  # the mapping keeps the pages alive
+
+        start = time.perf_counter()
+        count = 0
+        for frame in self.source.iter_frames(fps=self.fps, dtype='uint8'):
+            if count == len(frames):
+                break
+            frames[count] = frame
+            count += 1
+        self.decode_seconds = time.perf_counter() - start
+        self.frames = frames[:max(1, count)]
+        self.source.close()
+
+    def _ring_frame(self, t):
+        return self.frames[int(t * self.fps + 1e-6) % len(self.frames)]
+
+    def _timed(self, clip):
+        """`clip` with the time spent decoding its frames added to decode_seconds"""
+        def timed_frame(get_frame, t):
+            start = time.perf_counter()
+            frame = get_frame(t)
+            self.decode_seconds += time.perf_counter() - start
+            return frame
+        return clip.fl(timed_frame, keep_duration=True)
+
+    def print_stats(self):
+        detail = ''
+        if self.frames is not None:
+            detail = f", {len(self.frames)} frames ({self.frames.nbytes / 1024 ** 2:.0f}MB) decoded once"
+        print(f"   🎞️ Background decode: {self.decode_seconds:.1f}s "
+              f"for {os.path.basename(self.path)} [{self.mode}{detail}]")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Pure-Python MPEG audio Layer III frame parsing.
+
+gTTS returns plain MP3 streams. Walking their frame headers is enough to
+join several streams into one without decoding them: ID3 tags and
+Xing/Info header frames are dropped, and the remaining audio frames are
+concatenated byte for byte.
+
+The same walk gives a stream's duration without starting an ffmpeg reader:
+a Xing/Info or VBRI header states the frame count outright, and otherwise
+every frame header is read and its samples are added up, which is exact
+for CBR and VBR streams alike. Frame syncs are only two bytes, so any file
+will show a few "frames"; a stream is only accepted as MP3 when it starts
+with a run of back-to-back frames and frames make up nearly all of it.
+"""
+
+# Bitrates in kbps for Layer III, by MPEG version
+BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+VERSIONS = {0: 2.5, 2: 2, 3: 1}
+MIN_SYNC_FRAMES = 3  # back-to-back frames needed to trust the first header
+MIN_FRAME_COVERAGE = 0.9  # share of the untagged bytes that must be frames
+
+class MP3Frame:
+    """Header fields of one Layer III frame"""
+
+    def __init__(self, offset, length, version, sample_rate, channels, bitrate, side_info_end):
+        self.offset = offset
+        self.length = length
+        self.version = version
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bitrate = bitrate
+        self.side_info_end = side_info_end  # where a Xing/Info tag would start
+
+    @property
+    def samples(self):
+        return 1152 if self.version == 1 else 576
+
+def id3v2_size(data, offset=0):
+    """Length of an ID3v2 tag starting at `offset`, 0 if there is none"""
+    if data[offset:offset + 3] != b'ID3' or len(data) < offset + 10:
+        return 0
+    size = 0
+    for byte in data[offset + 6:offset + 10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[offset + 5] & 0x10 else 0
+    return 10 + size + footer
+
+def parse_header(data, offset):
+    """MP3Frame for a Layer III frame header at `offset`, or None"""
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = VERSIONS.get((b1 >> 3) & 0x03)
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if (b3 >> 6) == 3 else 2
+    coefficient = 144 if version == 1 else 72
+    length = coefficient * bitrate // sample_rate + padding
+
+    side_info = {(1, 1): 17, (1, 2): 32}.get((version, channels), 9 if channels == 1 else 17)
+    crc = 0 if b1 & 0x01 else 2
+    return MP3Frame(offset, length, version, sample_rate, channels, bitrate,
+                    offset + 4 + crc + side_info)
+
+def is_info_frame(data, frame):
+    """True for the Xing/Info (or VBRI) frame that carries no audio"""
+    tag = data[frame.side_info_end:frame.side_info_end + 4]
+    return tag in (b'Xing', b'Info') or data[frame.offset + 36:frame.offset + 40] == b'VBRI'
+
+def xing_frame_count(data, frame):
+    """Frame count stated by a Xing/Info or VBRI header frame, None if it has none"""
+    start = frame.side_info_end
+    if data[start:start + 4] in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[start + 4:start + 8], 'big')
+        if flags & 0x01:
+            return int.from_bytes(data[start + 8:start + 12], 'big')
+    elif data[frame.offset + 36:frame.offset + 40] == b'VBRI':
+        return int.from_bytes(data[frame.offset + 50:frame.offset + 54], 'big')
+    return None
+
+def iter_frames(data):
+    """Every Layer III frame in `data`, skipping ID3v2 tags and junk bytes"""
+    offset = id3v2_size(data)
+    while offset + 4 <= len(data):
+        frame = parse_header(data, offset)
+        if frame is None or frame.length <= 4:
+            if data[offset:offset + 3] == b'ID3':
+                offset += max(1, id3v2_size(data, offset))
+            else:
+                offset += 1  # resynchronize on the next frame header
+            continue
+        if offset + frame.length > len(data):
+            break
+        yield frame
+        offset += frame.length
+
+def audio_frames(data):
+    """The bytes of `data`'s audio frames, without tags or Xing/Info frames"""
+    return b''.join(data[frame.offset:frame.offset + frame.length]
+                    for frame in iter_frames(data) if not is_info_frame(data, frame))
+
+def join_streams(streams):
+    """One MP3 stream playing `streams` back to back, without re-encoding"""
+    return b''.join(audio_frames(stream) for stream in streams)
+
+def check_stream(data, frames):
+    """Raise ValueError unless `frames` look like a real MP3 stream in `data`"""
+    if not frames:
+        raise ValueError("no MPEG audio frames found")
+    first = frames[0]
+    sync = frames[:MIN_SYNC_FRAMES]
+    for previous, frame in zip(sync, sync[1:]):
+        if (frame.offset != previous.offset + previous.length or frame.version != first.version
+                or frame.sample_rate != first.sample_rate):
+            raise ValueError("no run of consecutive MPEG audio frames; not an MP3 stream")
+
+    untagged = len(data) - id3v2_size(data)
+    if data[-128:-125] == b'TAG':
+        untagged -= 128  # ID3v1 tag
+    framed = sum(frame.length for frame in frames)
+    if framed < MIN_FRAME_COVERAGE * untagged:
+        raise ValueError(f"only {framed} of {untagged} bytes are MPEG audio frames; "
+                         "not an MP3 stream")
+
+def stream_duration(data):
+    """Playing time of an MP3 in seconds, read from its frame headers alone.
+
+    Raises ValueError when `data` is not an MP3 stream.
+    """
+    frames = list(iter_frames(data))
+    check_stream(data, frames)
+    first = frames[0]
+    if is_info_frame(data, first):
+        count = xing_frame_count(data, first)
+        if count:
+            return count * first.samples / first.sample_rate
+        frames = frames[1:]
+    return sum(frame.samples for frame in frames) / first.sample_rate
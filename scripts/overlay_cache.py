@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of rendered overlay rasters.
+
+Titles, subtitles, scripture headers and the branding line repeat across
+videos, yet each one used to be rasterized again for every render. Rasters
+are keyed by a hash of everything that affects their pixels (text, font,
+size, colours, stroke, wrap width, alignment) and stored as premultiplied
+RGBA cropped to the tight bounding box of their visible pixels. A small
+in-memory LRU serves repeats within one process; an on-disk tier of .npy
+files serves them across processes through a memory-map. Disk entries are
+evicted least-recently-used under a byte budget.
+
+Configuration (environment):
+    OVERLAY_CACHE_DIR            where rasters are stored
+    OVERLAY_CACHE_MAX_BYTES      disk budget, 0 disables the disk tier
+    OVERLAY_CACHE_MEMORY_ITEMS   rasters kept in memory
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from disk_lru import evict, lazy_default
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tmp', 'overlay_cache'
+)
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2  # 256 MB
+DEFAULT_MEMORY_ITEMS = 64
+
+def premultiply(rgba):
+    """Straight-alpha uint8 RGBA to premultiplied, rounding to nearest"""
+    out = rgba.copy()
+    alpha = rgba[:, :, 3:4].astype(np.uint16)
+    out[:, :, :3] = (rgba[:, :, :3] * alpha + 127) // 255
+    return out
+
+def tight_bbox(alpha):
+    """(x0, y0, x1, y1) of the non-zero pixels of `alpha`, empty if there are none"""
+    rows = np.flatnonzero(alpha.any(axis=1))
+    columns = np.flatnonzero(alpha.any(axis=0))
+    if not len(rows):
+        return 0, 0, 0, 0
+    return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+class OverlayRaster:
+    """Premultiplied RGBA pixels of an overlay, cropped to `bbox` within `size`"""
+
+    def __init__(self, pixels, bbox, size):
+        self.pixels = pixels
+        self.bbox = tuple(bbox)
+        self.size = tuple(size)
+
+    @classmethod
+    def from_straight(cls, rgba):
+        bbox = tight_bbox(rgba[:, :, 3])
+        x0, y0, x1, y1 = bbox
+        pixels = premultiply(rgba[y0:y1, x0:x1])
+        return cls(pixels, bbox, (rgba.shape[1], rgba.shape[0]))
+
+    @property
+    def nbytes(self):
+        return self.pixels.nbytes
+
+    def straight(self):
+        """Full-size straight-alpha RGBA array, as moviepy's ImageClip expects"""
+        width, height = self.size
+        rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        x0, y0, x1, y1 = self.bbox
+        alpha = self.pixels[:, :, 3:4].astype(np.uint16)
+        region = rgba[y0:y1, x0:x1]
+        np.floor_divide(self.pixels[:, :, :3].astype(np.uint16) * 255 + alpha // 2,
+                        np.maximum(alpha, 1), out=region[:, :, :3], casting='unsafe')
+        region[:, :, 3:4] = self.pixels[:, :, 3:4]
+        return rgba
+
+class OverlayCache:
+    """Two-tier (memory LRU, then disk) store of overlay rasters"""
+
+    def __init__(self, cache_dir=None, max_bytes=None, memory_items=None):
+        self.cache_dir = cache_dir or os.environ.get('OVERLAY_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else os.environ.get('OVERLAY_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.memory_items = int(memory_items if memory_items is not None
+                                else os.environ.get('OVERLAY_CACHE_MEMORY_ITEMS',
+                                                    DEFAULT_MEMORY_ITEMS))
+        self._memory = OrderedDict()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(params):
+        """Content hash of everything that determines an overlay's pixels"""
+        digest = hashlib.sha1(repr((CACHE_FORMAT_VERSION, params)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, params, render):
+        """Raster for `params`, calling `render()` for straight RGBA on a miss"""
+        key = self.key(params)
+
+        raster = self._memory.get(key)
+        if raster is not None:
+            self._memory.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return raster
+
+        raster = self._load(key)
+        if raster is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            raster = OverlayRaster.from_straight(render())
+            self._store(key, raster)
+
+        self._memory[key] = raster
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+        return raster
+
+    def hit_rate(self):
+        lookups = sum(self.stats.values())
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        return hits / lookups if lookups else 0.0
+
+    def print_stats(self):
+        print(f"   ♻️ Overlay cache: {self.stats['memory_hits']} memory hits, "
+              f"{self.stats['disk_hits']} disk hits, {self.stats['misses']} misses "
+              f"({self.hit_rate():.0%} hit rate)")
+
+    def _paths(self, key):
+        return (os.path.join(self.cache_dir, f"{key}.npy"),
+                os.path.join(self.cache_dir, f"{key}.json"))
+
+    def _load(self, key):
+        if self.max_bytes <= 0:
+            return None
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            pixels = np.load(data_path, mmap_mode='r') if meta['bytes'] else np.zeros(
+                (0, 0, 4), dtype=np.uint8)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(meta_path)  # mark as recently used
+        return OverlayRaster(pixels, meta['bbox'], meta['size'])
+
+    def _store(self, key, raster):
+        if self.max_bytes <= 0 or raster.nbytes > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        evict(self.cache_dir, '.npy', self.max_bytes, raster.nbytes)
+        data_path, meta_path = self._paths(key)
+
+        # Data first, then metadata: an entry exists only once both are complete
+        fd, temp_data = tempfile.mkstemp(dir=self.cache_dir, suffix='.npy.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.ascontiguousarray(raster.pixels))
+        os.replace(temp_data, data_path)
+
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'bbox': list(raster.bbox),
+            'size': list(raster.size),
+            'bytes': raster.nbytes,
+        }
+        fd, temp_meta = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_meta, meta_path)
+
+overlay_cache = lazy_default(OverlayCache, "The process-wide overlay cache")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Overlay compositing that pre-blends static layers once.
+
+CompositeVideoClip blends every overlay onto the background on every frame
+for the whole video, although titles, scripture lines and branding only
+change during their short crossfadein after a staggered set_start. Here
+each text overlay is a RasterClip that knows its premultiplied raster, its
+fixed position, its active window [start, end) and its fade-in window.
+At any time the overlays split into layers that are fading in and runs of
+consecutive static layers; every static run is pre-blended into
+premultiplied RGBA layers (one per group of overlapping boxes) the first
+time it occurs and reused afterwards. Every blend goes through
+alpha_blend's integer kernel and touches only its layer's bounding box.
+Once all fades are over, a frame costs one background copy and one blend
+per group.
+
+Overlays that are not RasterClips (e.g. clips with a moving position) fall
+back to blend_overlay every frame.
+"""
+import numpy as np
+from moviepy.video.VideoClip import ImageClip, VideoClip
+from moviepy.video.compositing.transitions import crossfadein
+
+from alpha_blend import blend_premultiplied
+from theme_layers import FramePool
+
+POSITION_ALIASES = {
+    'center': ['center', 'center'],
+    'left': ['left', 'center'],
+    'right': ['right', 'center'],
+    'top': ['center', 'top'],
+    'bottom': ['center', 'bottom'],
+}
+
+def overlay_position(clip, t, frame_size, overlay_size):
+    """Top-left corner of `clip` at clip time `t`, resolved like moviepy's blit_on"""
+    width, height = frame_size
+    overlay_width, overlay_height = overlay_size
+
+    pos = clip.pos(t)
+    pos = list(POSITION_ALIASES[pos]) if isinstance(pos, str) else list(pos)
+
+    if clip.relative_pos:
+        for i, dim in enumerate([width, height]):
+            if not isinstance(pos[i], str):
+                pos[i] = dim * pos[i]
+
+    if isinstance(pos[0], str):
+        pos[0] = {'left': 0, 'center': (width - overlay_width) / 2, 'right': width - overlay_width}[pos[0]]
+    if isinstance(pos[1], str):
+        pos[1] = {'top': 0, 'center': (height - overlay_height) / 2, 'bottom': height - overlay_height}[pos[1]]
+
+    return int(pos[0]), int(pos[1])
+
+def blend_overlay(frame, clip, t):
+    """Blend the overlay clip onto `frame` in place, touching only its bounding box"""
+    ct = t - clip.start
+    img = clip.get_frame(ct)
+    mask = clip.mask.get_frame(ct) if clip.mask else None
+    if mask is not None and img.shape[:2] != mask.shape[:2]:
+        img = clip.fill_array(img, mask.shape)
+
+    height, width = frame.shape[:2]
+    overlay_height, overlay_width = img.shape[:2]
+    x, y = overlay_position(clip, ct, (width, height), (overlay_width, overlay_height))
+
+    # Clip the overlay against the frame edges
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + overlay_width), min(height, y + overlay_height)
+    if x0 >= x1 or y0 >= y1:
+        return frame
+
+    img = img[y0 - y:y1 - y, x0 - x:x1 - x]
+    region = frame[y0:y1, x0:x1]
+    if mask is None:
+        region[:] = img
+    else:
+        mask = mask[y0 - y:y1 - y, x0 - x:x1 - x, np.newaxis]
+        region[:] = 1.0 * mask * img + (1.0 - mask) * region
+    return frame
+
+def _clip_rect(x, y, pixels, frame_size):
+    """Part of `pixels` placed at (x, y) that lies inside the frame, or None"""
+    width, height = frame_size
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + pixels.shape[1]), min(height, y + pixels.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1, pixels[y0 - y:y1 - y, x0 - x:x1 - x]
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+class RasterClip(ImageClip):
+    """ImageClip of an overlay_cache.OverlayRaster.
+
+    It remembers the position and crossfadein given to it, so an
+    OverlayCompositor can blend its raster directly. Other effects applied
+    to the clip are not seen by the compositor.
+    """
+
+    def __init__(self, raster):
+        super().__init__(raster.straight(), transparent=True)
+        self.raster = raster
+        self.fixed_position = (0, 0)
+        self.fade_in = 0
+
+    def set_position(self, pos, relative=False):
+        clip = super().set_position(pos, relative)
+        clip.fixed_position = None if callable(pos) else pos
+        return clip
+
+    def crossfadein(self, duration):
+        clip = crossfadein(self, duration)
+        clip.fade_in = duration
+        return clip
+
+class _RasterLayer:
+    """Premultiplied pixels of one RasterClip at their place in the frame"""
+
+    def __init__(self, clip, frame_size):
+        raster = clip.raster
+        x, y = overlay_position(clip, 0, frame_size, raster.size)
+        self.x = x + raster.bbox[0]
+        self.y = y + raster.bbox[1]
+        self.pixels = raster.pixels
+        self.start = clip.start
+        self.end = clip.end
+        self.fade_in = clip.fade_in
+
+    def state(self, t):
+        """'hidden', 'fading' or 'static' at time `t`"""
+        if t < self.start or (self.end is not None and t >= self.end):
+            return 'hidden'
+        if t - self.start < self.fade_in:
+            return 'fading'
+        return 'static'
+
+class OverlayCompositor:
+    """Composites a background clip and its overlays, like CompositeVideoClip"""
+
+    def __init__(self, clips, size=None):
+        self.background = clips[0]
+        self.size = tuple(size or self.background.size)
+        self.layers = [
+            _RasterLayer(clip, self.size)
+            if isinstance(clip, RasterClip) and clip.fixed_position is not None else clip
+            for clip in clips[1:]
+        ]
+        self._runs = {}
+
+    def _static_run(self, indices):
+        """Pre-blended [(x, y, pixels)] of the consecutive static layers `indices`.
+
+        Layers whose boxes overlap are merged into one premultiplied layer;
+        disjoint groups stay separate so no blend covers the gap between them.
+        """
+        run = self._runs.get(indices)
+        if run is not None:
+            return run
+
+        groups = []
+        for index in indices:
+            layer = self.layers[index]
+            rect = _clip_rect(layer.x, layer.y, layer.pixels, self.size)
+            if rect is None:
+                continue
+            box, members = rect[:4], [(index, rect)]
+            overlapping = [group for group in groups if _overlaps(group[0], box)]
+            while overlapping:
+                for group in overlapping:
+                    groups.remove(group)
+                    box = (min(box[0], group[0][0]), min(box[1], group[0][1]),
+                           max(box[2], group[0][2]), max(box[3], group[0][3]))
+                    members = group[1] + members
+                overlapping = [group for group in groups if _overlaps(group[0], box)]
+            groups.append((box, sorted(members, key=lambda member: member[0])))
+
+        run = []
+        for (x0, y0, x1, y1), members in groups:
+            canvas = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.uint8)
+            for _, (lx0, ly0, _, _, pixels) in members:
+                blend_premultiplied(canvas, pixels, lx0 - x0, ly0 - y0)
+            run.append((x0, y0, canvas))
+        self._runs[indices] = run
+        return run
+
+    def render_into(self, out, t):
+        np.copyto(out, self.background.get_frame(t), casting='unsafe')
+
+        static_run = []
+        for index, layer in enumerate(self.layers):
+            if not isinstance(layer, _RasterLayer):
+                self._flush(out, static_run)
+                if layer.is_playing(t):
+                    blend_overlay(out, layer, t)
+                continue
+
+            state = layer.state(t)
+            if state == 'static':
+                static_run.append(index)
+            elif state == 'fading':
+                self._flush(out, static_run)
+                blend_premultiplied(out, layer.pixels, layer.x, layer.y,
+                                    (t - layer.start) / layer.fade_in)
+        self._flush(out, static_run)
+        return out
+
+    def _flush(self, out, static_run):
+        if not static_run:
+            return
+        for x, y, pixels in self._static_run(tuple(static_run)):
+            blend_premultiplied(out, pixels, x, y)
+        static_run.clear()
+
+def composite_overlays(clips, size=None, pool_size=3):
+    """VideoClip of `clips` composited by an OverlayCompositor.
+
+    Stands in for CompositeVideoClip(clips) when the first clip is a full
+    frame background.
+    """
+    compositor = OverlayCompositor(clips, size)
+    pool = FramePool(compositor.size, pool_size)
+    ends = [clip.end for clip in clips]
+    duration = None if None in ends else max(ends)
+
+    def make_frame(t):
+        return compositor.render_into(pool.acquire(), t)
+
+    clip = VideoClip(make_frame, duration=duration)
+    clip.compositor = compositor
+    return clip
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Threshold palettes and colour lookup tables for gradient themes.
+
+Several themes pick each row's colour with `if position < 0.3 ... elif`
+branches and then shade it with a small integer wave, clamping every channel
+in Python. A ThresholdPalette declares those colour stops once. Rows are
+assigned to a band once per theme, and every (band, wave) colour is
+precomputed into a uint8 lookup table, so a frame's column is a single
+fancy-indexed take with no Python branching.
+"""
+import numpy as np
+
+class ThresholdPalette:
+    """Colour bands selected by thresholds on a position.
+
+    `stops` is a list of (bound, colour) pairs, the last bound being None.
+    A position belongs to the first band with position < bound (position >
+    bound when `descending`). `colour(values)` returns the three channels
+    for an array of values (a wave or the position itself), as ints or int
+    arrays. Channels are clamped to 0..255, or wrap like a uint8 store when
+    `clamp` is False.
+    """
+
+    def __init__(self, stops, descending=False, clamp=True):
+        self.bounds = [bound for bound, _ in stops[:-1]]
+        self.colours = [colour for _, colour in stops]
+        self.descending = descending
+        self.clamp = clamp
+
+    def band_index(self, positions):
+        """Band of every position, as an int array"""
+        positions = np.asarray(positions)
+        bands = np.full(positions.shape, len(self.colours) - 1, dtype=np.int64)
+        for band in reversed(range(len(self.bounds))):
+            if self.descending:
+                bands[positions > self.bounds[band]] = band
+            else:
+                bands[positions < self.bounds[band]] = band
+        return bands
+
+    def evaluate(self, bands, values):
+        """uint8 colours for per-element bands and values, shape (n, 3)"""
+        bands = np.asarray(bands)
+        values = np.asarray(values)
+        colours = np.zeros(bands.shape + (3,), dtype=np.int64)
+        for band, colour in enumerate(self.colours):
+            in_band = bands == band
+            if not in_band.any():
+                continue
+            channels = colour(values[in_band])
+            for channel in range(3):
+                colours[in_band, channel] = channels[channel]
+        if self.clamp:
+            np.clip(colours, 0, 255, out=colours)
+        return colours.astype(np.uint8)
+
+    def lookup_table(self, low, high):
+        """PaletteLUT over every integer value from `low` to `high` inclusive"""
+        return PaletteLUT(self, low, high)
+
+class PaletteLUT:
+    """Precomputed uint8 colours for every (band, integer value) pair"""
+
+    def __init__(self, palette, low, high):
+        self.low = low
+        values = np.arange(low, high + 1)
+        band_count = len(palette.colours)
+        self.table = palette.evaluate(
+            np.repeat(np.arange(band_count), len(values)),
+            np.tile(values, band_count)
+        ).reshape(band_count, len(values), 3)
+
+    def __call__(self, bands, values):
+        return self.table[bands, values - self.low]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Time-sharded multiprocess export of a composed video.
+
+write_videofile renders and encodes one frame at a time in one process. Here
+the timeline is cut into segments that start on keyframe boundaries; forked
+worker processes inherit the fully built clip (same theme, overlays and
+seed), each renders and encodes its own segment through the same
+render/encode pipeline as ffmpeg_pipe, and ffmpeg's concat demuxer
+joins the segments with stream copy while the narration, encoded once
+through render_output's AAC cache, is stream-copied in. Segments live in the
+job's scratch directory and the MP4 is renamed into place when complete.
+
+Configuration (environment):
+    RENDER_WORKERS    worker processes used when a script does not say
+"""
+import math
+import multiprocessing
+import os
+import subprocess
+import time
+
+import numpy as np
+from moviepy.config import get_setting
+
+from ffmpeg_pipe import FFmpegPipeWriter, encode_frames, print_pipeline_stats
+from render_output import aac_cache, atomic_output, job_scratch
+
+KEYFRAME_INTERVAL_SECONDS = 2  # every segment starts on a multiple of this
+
+# Clip being exported; forked workers inherit it instead of unpickling it
+_export_clip = None
+
+def default_render_workers():
+    """Worker processes for parallel export, 1 meaning the serial writer"""
+    return max(1, int(os.environ.get('RENDER_WORKERS', 1)))
+
+def segment_bounds(duration, fps, segments):
+    """Split the frames of `duration` seconds into (first_frame, frame_count) runs.
+
+    Runs start on keyframe-interval boundaries, so there are never more runs
+    than keyframe intervals in the video.
+    """
+    total_frames = int(math.ceil(duration * fps - 1e-9))
+    gop = KEYFRAME_INTERVAL_SECONDS * fps
+    groups = max(1, int(math.ceil(total_frames / gop)))
+    segments = max(1, min(segments, groups))
+
+    bounds = []
+    for segment in range(segments):
+        first_frame = gop * (groups * segment // segments)
+        last_frame = min(total_frames, gop * (groups * (segment + 1) // segments))
+        bounds.append((first_frame, last_frame - first_frame))
+    return bounds
+
+def _render_segment(job):
+    segment_path, first_frame, frame_count, fps, codec, preset, bitrate, threads, buffers = job
+    clip = _export_clip
+
+    def render_into(frame, t):
+        np.copyto(frame, clip.get_frame(t), casting='unsafe')
+
+    writer = FFmpegPipeWriter(
+        segment_path, clip.size, fps,
+        codec=codec,
+        preset=preset,
+        bitrate=bitrate,
+        threads=threads,
+        ffmpeg_params=['-g', str(KEYFRAME_INTERVAL_SECONDS * fps)]
+    )
+    with writer:
+        stats = encode_frames(render_into, clip.size, fps, first_frame, frame_count, writer, buffers)
+    return segment_path, stats
+
+def write_videofile_parallel(clip, output_file, fps, workers, audio_file=None,
+                             codec='libx264', audio_codec='aac', preset='medium',
+                             bitrate=None, audio_bitrate=None, threads=None, buffers=3):
+    """Render `clip` in `workers` processes and join the segments with ffmpeg.
+
+    `audio_file` is muxed once after the video segments are joined; the
+    clip's own audio is not used.
+    """
+    global _export_clip
+
+    bounds = segment_bounds(clip.duration, fps, workers)
+    ffmpeg = get_setting('FFMPEG_BINARY')
+
+    print(f"   🧩 Rendering {len(bounds)} segments in parallel...")
+    render_start = time.time()
+
+    with job_scratch(prefix='segments_') as segment_dir, atomic_output(output_file) as temp_output:
+        jobs = [
+            (os.path.join(segment_dir, f"segment_{index:03d}.mp4"), first_frame, frame_count,
+             fps, codec, preset, bitrate, threads, buffers)
+            for index, (first_frame, frame_count) in enumerate(bounds)
+        ]
+
+        _export_clip = clip
+        try:
+            with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+                results = pool.map(_render_segment, jobs)
+        finally:
+            _export_clip = None
+
+        print(f"   ✅ Segments rendered in {time.time() - render_start:.1f}s")
+        for index, (_, stats) in enumerate(results):
+            print_pipeline_stats(stats, f"Segment {index}")
+        segment_paths = [segment_path for segment_path, _ in results]
+
+        concat_list = os.path.join(segment_dir, 'segments.txt')
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            for segment_path in segment_paths:
+                f.write(f"file '{segment_path}'\n")
+
+        command = [ffmpeg, '-y', '-loglevel', 'error',
+                   '-f', 'concat', '-safe', '0', '-i', concat_list]
+        if audio_file:
+            audio = aac_cache().encoded(audio_file, segment_dir, audio_codec, audio_bitrate)
+            command += ['-i', audio, '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'copy', '-shortest']
+        command += ['-c:v', 'copy', temp_output]
+
+        subprocess.run(command, check=True)
+
+    return output_file
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Scratch space, encoded audio and atomic MP4 output for every export path.
+
+moviepy's write_videofile was called with temp_audiofile='temp-audio.m4a',
+relative to the working directory, so two renders on one host overwrote each
+other's audio, and the narration MP3 was decoded and re-encoded to AAC on
+every render. Here each export gets its own scratch directory under a
+configurable root (a tmpfs such as /dev/shm works well). The narration is
+encoded to AAC once per audio content hash and kept in an on-disk cache,
+and every writer stream-copies that AAC while it encodes the video, in a
+single ffmpeg pass. The MP4 is written under a temporary name
+next to its destination and renamed into place, so nobody ever picks up a
+half-written video.
+
+Configuration (environment):
+    RENDER_SCRATCH_DIR     parent of per-job scratch directories
+    AAC_CACHE_DIR          where encoded audio is stored
+    AAC_CACHE_MAX_BYTES    disk budget, 0 disables the cache
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from moviepy.config import get_setting
+
+from disk_lru import evict, lazy_default
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tmp', 'aac_cache'
+)
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2  # 512 MB
+
+def scratch_root():
+    """Directory that holds per-job scratch directories, None for the system default"""
+    return os.environ.get('RENDER_SCRATCH_DIR') or None
+
+@contextmanager
+def job_scratch(prefix='render_'):
+    """A private scratch directory for one export, removed afterwards"""
+    root = scratch_root()
+    if root:
+        os.makedirs(root, exist_ok=True)
+    path = tempfile.mkdtemp(prefix=prefix, dir=root)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+@contextmanager
+def atomic_output(output_file):
+    """Temporary path next to `output_file`, renamed onto it when the block succeeds"""
+    directory = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(directory, exist_ok=True)
+    name, extension = os.path.splitext(os.path.basename(output_file))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=extension, dir=directory)
+    os.close(fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, output_file)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class AACCache:
+    """Narration encoded to AAC, kept on disk by the source audio's content hash"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get('AAC_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else os.environ.get('AAC_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.stats = {'hits': 0, 'misses': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def encoded(self, audio_file, scratch_dir, codec='aac', bitrate=None):
+        """Path of `audio_file` encoded with `codec`, ready to be stream-copied.
+
+        When the cache is disabled the encoding is written to `scratch_dir`
+        and lives as long as it does.
+        """
+        source_hash = file_hash(audio_file)
+        key = hashlib.sha1(repr((CACHE_FORMAT_VERSION, source_hash, codec, bitrate))
+                           .encode('utf-8')).hexdigest()
+        data_path = os.path.join(self.cache_dir, f"{key}.m4a")
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+
+        if os.path.exists(meta_path) and os.path.exists(data_path):
+            os.utime(meta_path)  # mark as recently used
+            self._count('hits')
+            return data_path
+
+        self._count('misses')
+        caching = self.max_bytes > 0
+        if caching:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir if caching else scratch_dir,
+                                         suffix='.m4a')
+        os.close(fd)
+        try:
+            command = [get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+                       '-i', audio_file, '-vn', '-c:a', codec]
+            if bitrate:
+                command += ['-b:a', bitrate]
+            subprocess.run(command + [temp_path], check=True)
+            entry_bytes = os.path.getsize(temp_path)
+
+            if not caching or entry_bytes > self.max_bytes:
+                return temp_path  # removed with the scratch directory
+
+            evict(self.cache_dir, '.m4a', self.max_bytes, entry_bytes)
+            os.replace(temp_path, data_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'source_sha256': source_hash,
+            'codec': codec,
+            'bitrate': bitrate,
+            'bytes': entry_bytes,
+        }
+        fd, temp_meta = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_meta, meta_path)
+        return data_path
+
+    def print_stats(self):
+        print(f"   ♻️ AAC cache: {self.stats['hits']} hits, {self.stats['misses']} misses")
+
+aac_cache = lazy_default(AACCache, "The process-wide encoded-audio cache")
+
+def write_videofile_muxed(clip, output_file, fps, audio_file=None, audio_codec='aac',
+                          audio_bitrate=None, ffmpeg_params=None, **kwargs):
+    """clip.write_videofile with the narration stream-copied and the MP4 written atomically.
+
+    `audio_file` is encoded once through the AAC cache and muxed while the
+    video is encoded; without it the clip's own audio is written to the job's
+    scratch directory. Other keyword arguments go to write_videofile.
+    """
+    with job_scratch() as scratch, atomic_output(output_file) as temp_output:
+        if audio_file:
+            audio = aac_cache().encoded(audio_file, scratch, audio_codec, audio_bitrate)
+            ffmpeg_params = ['-shortest'] + list(ffmpeg_params or [])
+        else:
+            audio = True
+        clip.write_videofile(
+            temp_output,
+            fps=fps,
+            audio=audio,
+            audio_codec=audio_codec,
+            audio_bitrate=audio_bitrate,
+            temp_audiofile=os.path.join(scratch, 'audio.m4a'),
+            remove_temp=True,
+            ffmpeg_params=ffmpeg_params,
+            verbose=False,
+            logger=None,
+            **kwargs
+        )
+    return output_file
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Vectorized sprite and particle drawing for theme backgrounds.
+
+Stars, clouds and window lights used to be drawn with nested per-pixel
+Python loops on every frame. A SpriteLayer precomputes the pixel offsets and
+weights of one stamp mask; each frame then draws every sprite at once with a
+single scatter (paint) or saturating add, given the sprites' positions and
+brightness at that time.
+"""
+import zlib
+
+import numpy as np
+
+from theme_layers import saturating_add
+
+STYLE_VARIANTS = 4  # distinct looks of each seeded background
+
+def video_seed(*parts):
+    """Deterministic per-video random seed derived from the video's content"""
+    return zlib.crc32('|'.join(str(part) for part in parts).encode('utf-8'))
+
+def style_variant(*parts, variants=STYLE_VARIANTS):
+    """One of `variants` seeds chosen by the video's content.
+
+    Seeded backgrounds go through the loop cache, so a seed per video would
+    write a loop that is never used again; a few variants keep the cache warm.
+    """
+    return video_seed(*parts) % variants
+
+class SpriteLayer:
+    """Many copies of one stamp mask drawn with vectorized scatter operations.
+
+    `stamp` is a 2-D array of weights centred on the sprite's anchor; only
+    non-zero weights are drawn. With `anchor_inside`, sprites whose anchor is
+    off-frame are skipped entirely, otherwise they are clipped per pixel.
+    """
+
+    def __init__(self, stamp, size=(1080, 1920), anchor_inside=False):
+        stamp = np.asarray(stamp, dtype=np.float64)
+        stamp_ys, stamp_xs = np.nonzero(stamp)
+        self.offset_ys = stamp_ys - stamp.shape[0] // 2
+        self.offset_xs = stamp_xs - stamp.shape[1] // 2
+        self.weights = stamp[stamp_ys, stamp_xs]
+        self.size = size
+        self.anchor_inside = anchor_inside
+
+    def _scatter(self, positions, brightness, color):
+        """Pixel coordinates and per-channel values of every drawn stamp pixel"""
+        positions = np.asarray(positions).reshape(-1, 2)
+        width, height = self.size
+
+        xs = positions[:, 0:1] + self.offset_xs[np.newaxis, :]
+        ys = positions[:, 1:2] + self.offset_ys[np.newaxis, :]
+        valid = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        if self.anchor_inside:
+            anchor_valid = ((positions[:, 0] >= 0) & (positions[:, 0] < width)
+                            & (positions[:, 1] >= 0) & (positions[:, 1] < height))
+            valid &= anchor_valid[:, np.newaxis]
+
+        brightness = np.broadcast_to(np.asarray(brightness, dtype=np.float64), (len(positions),))
+        values = brightness[:, np.newaxis] * self.weights[np.newaxis, :]
+        values = values[valid][:, np.newaxis] * np.asarray(color, dtype=np.float64)[np.newaxis, :]
+        return ys[valid], xs[valid], values.astype(np.int64)
+
+    def paint(self, img, positions, brightness, color=(1.0, 1.0, 1.0)):
+        """Overwrite stamp pixels with int(brightness * weight * color); later sprites win"""
+        ys, xs, values = self._scatter(positions, brightness, color)
+        img[ys, xs] = values
+        return img
+
+    def add(self, img, positions, brightness, color=(1.0, 1.0, 1.0)):
+        """Add int(brightness * weight * color) to stamp pixels, saturating at 255"""
+        ys, xs, values = self._scatter(positions, brightness, color)
+        if len(ys) == 0:
+            return img
+
+        # Accumulate overlapping sprites over their bounding box first;
+        # saturating once equals saturating after every add
+        y0, x0 = ys.min(), xs.min()
+        box_height, box_width = ys.max() + 1 - y0, xs.max() + 1 - x0
+        box_index = (ys - y0) * box_width + (xs - x0)
+        totals = np.stack([
+            np.bincount(box_index, weights=values[:, channel], minlength=box_height * box_width)
+            for channel in range(3)
+        ], axis=1).reshape(box_height, box_width, 3)
+        totals = np.minimum(totals, 255).astype(np.uint8)
+
+        saturating_add(img[y0:y0 + box_height, x0:x0 + box_width], totals)
+        return img
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""In-process text rasterizing with Pillow, replacing moviepy's TextClip.
+
+TextClip shells out to ImageMagick for every title, subtitle, scripture line
+and branding clip: one subprocess, one temporary PNG and one decode each, and
+a hard-coded `convert` path that only exists on macOS. Here the text is laid
+out and drawn with Pillow's ImageFont/ImageDraw straight into a NumPy RGBA
+array, with the same options the scripts pass to TextClip: font size, colour,
+stroke colour and width, caption wrapping to a width and alignment.
+
+Fill and stroke are drawn as separate coverage masks and combined with
+straight (non-premultiplied) alpha, so antialiased edges keep their colour
+instead of fading through black.
+
+Configuration (environment):
+    TEXT_FONT         font file used for regular text ('Arial')
+    TEXT_FONT_BOLD    font file used for bold text ('Arial-Bold')
+
+Without them the first installed font with Hangul glyphs is used; if there
+is none, check_fonts() fails at startup, naming the variable to set, rather
+than drawing Korean text as empty boxes halfway through a render.
+
+Blank text has nothing to draw, so text_clip() returns None for it.
+
+Rasters are served from overlay_cache, so a title seen before is not drawn
+again.
+"""
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from overlay_cache import overlay_cache
+from overlay_compositor import RasterClip
+
+LINE_SPACING = 4  # extra pixels between lines, like Pillow's multiline default
+
+# Fonts tried in order for each TextClip font name; all of them cover Hangul
+FONT_CANDIDATES = {
+    'regular': [
+        '/usr/share/fonts/truetype/nanum/NanumGothic.ttf',
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+        '/System/Library/Fonts/AppleSDGothicNeo.ttc',
+        '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
+        '/Library/Fonts/Arial Unicode.ttf',
+    ],
+    'bold': [
+        '/usr/share/fonts/truetype/nanum/NanumGothicBold.ttf',
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc',
+        '/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc',
+        '/System/Library/Fonts/AppleSDGothicNeo.ttc',
+        '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
+        '/Library/Fonts/Arial Unicode.ttf',
+    ],
+}
+
+ALIGNMENTS = {
+    'center': 'center', 'left': 'left', 'west': 'left', 'right': 'right', 'east': 'right',
+}
+
+def font_path(font):
+    """Font file for a TextClip font name ('Arial', 'Arial-Bold') or a path"""
+    if font and os.path.isfile(font):
+        return font
+    weight = 'bold' if font and 'bold' in font.lower() else 'regular'
+    configured = os.environ.get('TEXT_FONT_BOLD' if weight == 'bold' else 'TEXT_FONT')
+    if configured:
+        return configured
+    for candidate in FONT_CANDIDATES[weight]:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def font_variable(font):
+    """The environment variable that configures a TextClip font name"""
+    return 'TEXT_FONT_BOLD' if font and 'bold' in font.lower() else 'TEXT_FONT'
+
+@lru_cache(maxsize=32)
+def load_font(font, fontsize):
+    path = font_path(font)
+    if path is None:
+        # Pillow's bundled font has no Hangul: Korean text would render as tofu
+        raise OSError(f"No font with Hangul glyphs found for '{font}'; install Nanum Gothic "
+                      f"or Noto Sans CJK, or set {font_variable(font)} to a font file")
+    try:
+        return ImageFont.truetype(path, fontsize)
+    except OSError as e:
+        raise OSError(f"Cannot load font {path} for '{font}'; "
+                      f"set {font_variable(font)} to a readable font file: {e}")
+
+def check_fonts(fonts=('Arial', 'Arial-Bold')):
+    """Load every font the scripts use, so a missing one fails before any work is done"""
+    for font in fonts:
+        load_font(font, 12)
+
+def wrap_text(text, font, width, stroke_width=0):
+    """Greedily wrap every paragraph of `text` to lines at most `width` pixels wide.
+
+    Lines break between words; a single word wider than `width` (such as a
+    long unspaced run of Hangul) is broken between characters.
+    """
+    def fits(line):
+        return font.getlength(line) + 2 * stroke_width <= width
+
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if fits(candidate):
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            line = ''
+            for char in word:
+                if line and not fits(line + char):
+                    lines.append(line)
+                    line = ''
+                line += char
+        lines.append(line)
+    return '\n'.join(lines)
+
+def render_text(txt, fontsize=48, color='black', font='Arial', stroke_color=None,
+                stroke_width=1, size=(None, None), method='label', align='center',
+                interline=None):
+    """Rasterize `txt` to a straight-alpha RGBA uint8 array of shape (h, w, 4).
+
+    Arguments follow TextClip: 'label' fits the image to the text, 'caption'
+    wraps the text to `size[0]` and makes the image exactly that wide.
+    """
+    pil_font = load_font(font, fontsize)
+    stroke_width = int(stroke_width or 0) if stroke_color else 0
+    spacing = LINE_SPACING if interline is None else interline
+    align = ALIGNMENTS.get(str(align).lower(), 'center')
+
+    width, height = size
+    if method == 'caption' and width:
+        txt = wrap_text(txt, pil_font, width, stroke_width)
+
+    # Lay lines out once so the fill and stroke passes share every position
+    lines = txt.split('\n')
+    ascent, descent = pil_font.getmetrics()
+    line_height = ascent + descent + spacing
+    line_widths = [math.ceil(pil_font.getlength(line)) + 2 * stroke_width for line in lines]
+    text_width = max(line_widths)
+    text_height = len(lines) * line_height - spacing + 2 * stroke_width
+    image_width = width if method == 'caption' and width else text_width
+    image_height = height or text_height
+
+    # Place the text block inside the image like ImageMagick's gravity
+    top = (image_height - text_height) // 2 + stroke_width
+    origins = []
+    for index, line_width in enumerate(line_widths):
+        x = {'left': 0, 'center': (image_width - line_width) // 2,
+             'right': image_width - line_width}[align] + stroke_width
+        origins.append((x, top + index * line_height))
+
+    def coverage(stroke):
+        mask = Image.new('L', (image_width, image_height), 0)
+        draw = ImageDraw.Draw(mask)
+        for line, origin in zip(lines, origins):
+            draw.text(origin, line, fill=255, font=pil_font, anchor='la',
+                      stroke_width=stroke, stroke_fill=255)
+        return np.asarray(mask, dtype=np.uint16)
+
+    fill = coverage(0)
+    rgba = np.empty((image_height, image_width, 4), dtype=np.uint8)
+    fill_rgb = np.array(ImageColor.getrgb(color)[:3], dtype=np.uint16)
+
+    if stroke_width:
+        outline = coverage(stroke_width)
+        stroke_rgb = np.array(ImageColor.getrgb(stroke_color)[:3], dtype=np.uint16)
+        # Fill colour over the stroke colour, weighted by fill coverage
+        fill = fill[:, :, np.newaxis]
+        rgba[:, :, :3] = (fill * fill_rgb + (255 - fill) * stroke_rgb + 127) // 255
+        rgba[:, :, 3] = np.maximum(outline, fill[:, :, 0])
+    else:
+        rgba[:, :, :3] = fill_rgb
+        rgba[:, :, 3] = fill
+    return rgba
+
+def cached_text(txt, fontsize=48, color='black', font='Arial', stroke_color=None,
+                stroke_width=1, size=(None, None), method='label', align='center',
+                interline=None):
+    """render_text() through the overlay cache, as an OverlayRaster"""
+    params = ('text', txt, font, font_path(font), fontsize, color, stroke_color, stroke_width,
+              tuple(size), method, align, interline)
+    return overlay_cache().get(params, lambda: render_text(
+        txt, fontsize, color, font, stroke_color, stroke_width, size, method, align, interline))
+
+def text_clip(txt, fontsize=48, color='black', font='Arial', stroke_color=None,
+              stroke_width=1, size=(None, None), method='label', align='center',
+              interline=None):
+    """Drop-in replacement for TextClip: a RasterClip with the text's alpha as mask.
+
+    Returns None for blank text, which has no overlay to draw.
+    """
+    if not txt or not txt.strip():
+        return None
+    return RasterClip(cached_text(txt, fontsize, color, font, stroke_color, stroke_width,
+                                  size, method, align, interline))
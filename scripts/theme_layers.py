@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Separable theme backgrounds rendered as broadcast views.
+
+Most themes paint every row in a single colour and then np.roll the whole
+frame, allocating and touching a fresh 6 MB image several times per frame.
+A theme that declares its structure here only produces one column (or row)
+vector per frame; the full frame is a zero-copy np.broadcast_to view that is
+materialised once, by whoever consumes it (the compositor or the encoder).
+np.roll is replaced by slicing into a doubled copy of the static base.
+
+Every layer also splits into a per-frame `prepare(t)` step and a
+`render_band(state, band, y0, y1)` step that fills rows y0:y1 of a real
+image, so band_renderer.BandRenderer can fill one frame from several threads.
+
+Separable layers can also turn a prepared state (their column, row or
+scrolled view) back into a frame with `state_frame(state)`, which lets
+keyframes.KeyframeBackground interpolate the small state instead of frames.
+
+Full-frame themes implement `render_into(out, t)`, drawing in place into a
+uint8 frame supplied by the caller (a FramePool buffer, or a frame of the
+background cache file) instead of allocating a new image every frame.
+"""
+import numpy as np
+
+def _broadcast_frame(block, size):
+    return np.broadcast_to(block, (size[1], size[0], 3))
+
+def saturating_add(out, value):
+    """out += value for uint8 arrays, clamping at 255 without a wider temporary"""
+    np.minimum(out, 255 - value, out=out)
+    out += value
+    return out
+
+class FramePool:
+    """Ring of preallocated uint8 frames handed out in turn.
+
+    A frame is handed out again after `count` further acquisitions, so a
+    consumer must be done with it by then.
+    """
+
+    def __init__(self, size=(1080, 1920), count=3):
+        self.frames = [np.empty((size[1], size[0], 3), dtype=np.uint8) for _ in range(max(1, count))]
+        self._next = 0
+
+    def acquire(self):
+        frame = self.frames[self._next]
+        self._next = (self._next + 1) % len(self.frames)
+        return frame
+
+class RowConstantBackground:
+    """Background whose every row is one colour.
+
+    `column_at(t)` returns a (height, 3) uint8 array of row colours.
+    """
+
+    def __init__(self, column_at, size=(1080, 1920)):
+        self.column_at = column_at
+        self.size = size
+
+    def prepare(self, t):
+        return np.asarray(self.column_at(t), dtype=np.uint8)
+
+    def render_band(self, column, band, y0, y1):
+        band[:] = column[y0:y1, np.newaxis, :]
+
+    def render_into(self, out, t):
+        self.render_band(self.prepare(t), out, 0, self.size[1])
+
+    def state_frame(self, column):
+        return _broadcast_frame(column[:, np.newaxis, :], self.size)
+
+    def make_frame(self, t):
+        return self.state_frame(self.prepare(t))
+
+class ColumnConstantBackground:
+    """Background whose every column is one colour.
+
+    `row_at(t)` returns a (width, 3) uint8 array of column colours.
+    """
+
+    def __init__(self, row_at, size=(1080, 1920)):
+        self.row_at = row_at
+        self.size = size
+
+    def prepare(self, t):
+        return np.asarray(self.row_at(t), dtype=np.uint8)
+
+    def render_band(self, row, band, y0, y1):
+        band[:] = row[np.newaxis, :, :]
+
+    def render_into(self, out, t):
+        self.render_band(self.prepare(t), out, 0, self.size[1])
+
+    def state_frame(self, row):
+        return _broadcast_frame(row[np.newaxis, :, :], self.size)
+
+    def make_frame(self, t):
+        return self.state_frame(self.prepare(t))
+
+class ScrollingBackground:
+    """Static base shifted by `offset_at(t)` pixels, like np.roll(base, offset, axis).
+
+    `base` is (height, 1, 3) for row-constant bases, (1, width, 3) for
+    column-constant ones or a full (height, width, 3) image. Each frame is a
+    slice of the doubled base, so scrolling never copies pixels.
+    """
+
+    def __init__(self, base, offset_at, axis=0, size=(1080, 1920)):
+        base = np.asarray(base, dtype=np.uint8)
+        self.offset_at = offset_at
+        self.axis = axis
+        self.size = size
+        self.length = base.shape[axis]
+        self.doubled = np.concatenate([base, base], axis=axis)
+
+    def prepare(self, t):
+        start = (-int(self.offset_at(t))) % self.length
+        if self.axis == 0:
+            return self.doubled[start:start + self.length]
+        return self.doubled[:, start:start + self.length]
+
+    def render_band(self, view, band, y0, y1):
+        band[:] = _broadcast_frame(view, self.size)[y0:y1]
+
+    def render_into(self, out, t):
+        self.render_band(self.prepare(t), out, 0, self.size[1])
+
+    def state_frame(self, view):
+        return _broadcast_frame(view, self.size)
+
+    def make_frame(self, t):
+        return self.state_frame(self.prepare(t))
+
+class InPlaceBackground:
+    """Full-frame background drawn by `render_into(out, t)` into a supplied frame.
+
+    `render_into` must overwrite every pixel of `out`. make_frame(t) is the
+    moviepy-compatible shim: it renders into the next frame of a FramePool,
+    so the returned frame is only valid until `pool_size` more are made.
+    """
+
+    def __init__(self, render_into, size=(1080, 1920), pool_size=3):
+        self.render_into = render_into
+        self.size = size
+        self.pool = FramePool(size, pool_size)
+
+    def make_frame(self, t):
+        out = self.pool.acquire()
+        self.render_into(out, t)
+        return out
+
+class BandedBackground(InPlaceBackground):
+    """Full-frame background given as `prepare(t)` and `render_band(state, band, y0, y1)`.
+
+    `render_band` must fill every pixel of `band`, the rows y0:y1 of the frame.
+    """
+
+    def __init__(self, prepare, render_band, size=(1080, 1920), pool_size=3):
+        super().__init__(self._render_whole_frame, size, pool_size)
+        self.prepare = prepare
+        self.render_band = render_band
+
+    def _render_whole_frame(self, out, t):
+        self.render_band(self.prepare(t), out, 0, self.size[1])
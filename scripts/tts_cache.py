@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of synthesized speech.
+
+gTTS is the slowest stage of every render, and the same script text is
+spoken again whenever a theme is re-rendered or a video is regenerated after
+a theme change. Speech is keyed by a hash of the normalized text, language
+and speed, and stored as the MP3 gTTS returned plus a small JSON record with
+its duration, read from the in-memory MP3's frame headers rather than by
+opening a decoder. Entries are written to a temporary file and renamed
+into place, so concurrent workers never see a partial entry, and are evicted
+least-recently-used under a byte budget.
+
+Long scripts are split at sentence boundaries and the sentences are
+synthesized concurrently on a bounded thread pool, each request retried with
+exponential backoff. Every sentence is cached on its own, so editing one
+sentence only re-synthesizes that sentence. The sentence MP3s are joined
+frame by frame (mp3_frames.join_streams) into one continuous stream, the
+same way gTTS joins the parts of a long text, and the joined script is
+cached too.
+
+Callers get a private copy of the MP3 in the render scratch root
+(render_output.RENDER_SCRATCH_DIR), so another process evicting the entry
+cannot pull it away before the mux; `speech.release()` deletes it, and
+copies a failed render never released are removed at exit.
+
+Configuration (environment):
+    TTS_CACHE_DIR          where speech is stored
+    TTS_CACHE_MAX_BYTES    disk budget, 0 disables the cache
+    TTS_WORKERS            concurrent sentence requests
+    TTS_RETRIES            retries of a failed request
+"""
+import atexit
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from gtts import gTTS, gTTSError
+
+from disk_lru import evict, lazy_default
+from mp3_frames import join_streams, stream_duration
+from render_output import scratch_root
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tmp', 'tts_cache'
+)
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GB
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0  # doubled after every failed attempt
+
+# Sentence ends: terminal punctuation followed by space, or line breaks
+SENTENCE_BREAK = re.compile(r'(?<=[.!?。！？…])\s+|\s*\n\s*')
+
+def normalize_text(text):
+    """Text as it is spoken: NFC-composed Hangul, whitespace collapsed"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+def split_sentences(text):
+    """Sentences of `text`, split after terminal punctuation and at line breaks"""
+    sentences = (normalize_text(sentence) for sentence in SENTENCE_BREAK.split(text))
+    return [sentence for sentence in sentences if sentence]
+
+def gtts_bytes(text, lang='ko', slow=False, retries=None):
+    """MP3 bytes of one gTTS synthesis, retried with exponential backoff"""
+    retries = int(retries if retries is not None else os.environ.get('TTS_RETRIES', DEFAULT_RETRIES))
+    for attempt in range(retries + 1):
+        try:
+            buffer = io.BytesIO()
+            gTTS(text=text, lang=lang, slow=slow).write_to_fp(buffer)
+            return buffer.getvalue()
+        except (gTTSError, OSError) as e:
+            if attempt == retries:
+                raise
+            delay = RETRY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(1.0, 1.5)
+            print(f"   ⚠️ TTS request failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def measure_duration(path):
+    """Duration of an MP3 file from its frame headers, without opening a decoder"""
+    with open(path, 'rb') as f:
+        return stream_duration(f.read())
+
+_private_files = set()
+_private_lock = threading.Lock()
+
+def _write_private(data):
+    """Write `data` to a new private MP3 under the render scratch root"""
+    fd, path = tempfile.mkstemp(prefix='speech_', suffix='.mp3', dir=scratch_root())
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    with _private_lock:
+        _private_files.add(path)
+    return path
+
+@atexit.register
+def _remove_private_files():
+    """Delete speech files a script did not release, e.g. after a failed render"""
+    for path in list(_private_files):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+class Speech:
+    """An MP3 of synthesized speech and its duration in seconds.
+
+    `path` is a private copy that no cache eviction can remove; call
+    release() once the MP3 has been muxed or copied.
+    """
+
+    def __init__(self, path, duration, cached):
+        self.path = path
+        self.duration = duration
+        self.cached = cached
+
+    def release(self):
+        with _private_lock:
+            _private_files.discard(self.path)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+class TTSCache:
+    """Synthesizes speech with gTTS, keeping every result on disk"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get('TTS_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else os.environ.get('TTS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.stats = {'hits': 0, 'misses': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def key(text, lang, slow):
+        digest = hashlib.sha1(repr((CACHE_FORMAT_VERSION, text, lang, bool(slow))).encode('utf-8'))
+        return f"{lang}_{digest.hexdigest()}"
+
+    def synthesize(self, text, lang='ko', slow=False, produce=None):
+        """Speech for `text`, from the cache when it has been spoken before.
+
+        On a miss the MP3 bytes come from `produce(text)`, by default a
+        single gTTS synthesis.
+        """
+        data, duration, cached = self.speech_bytes(normalize_text(text), lang, slow, produce)
+        return Speech(_write_private(data), duration, cached)
+
+    def speech_bytes(self, text, lang='ko', slow=False, produce=None):
+        """(MP3 bytes, duration, cached) for normalized `text`, through the cache"""
+        key = self.key(text, lang, slow)
+        data_path = os.path.join(self.cache_dir, f"{key}.mp3")
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                duration = json.load(f)['duration']
+            with open(data_path, 'rb') as f:
+                data = f.read()
+            self._count('hits')
+            try:
+                os.utime(meta_path)  # mark as recently used
+            except OSError:
+                pass
+            return data, duration, True
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self._count('misses')
+        data = produce(text) if produce else gtts_bytes(text, lang, slow)
+        duration = stream_duration(data)
+        if 0 < len(data) <= self.max_bytes:
+            self._store(data_path, meta_path, data, {
+                'version': CACHE_FORMAT_VERSION,
+                'lang': lang,
+                'slow': bool(slow),
+                'characters': len(text),
+                'duration': duration,
+                'bytes': len(data),
+            })
+        return data, duration, False
+
+    def _store(self, data_path, meta_path, data, meta):
+        """Write an entry under temporary names and rename both files into place"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        evict(self.cache_dir, '.mp3', self.max_bytes, len(data))
+        for path, payload in ((data_path, data), (meta_path, json.dumps(meta).encode('utf-8'))):
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(payload)
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+
+    def synthesize_script(self, text, lang='ko', slow=False, workers=None):
+        """Speech for a whole script, synthesized sentence by sentence in parallel"""
+        sentences = split_sentences(text)
+        if len(sentences) <= 1:
+            return self.synthesize(text, lang, slow)
+        workers = int(workers or os.environ.get('TTS_WORKERS', DEFAULT_WORKERS))
+
+        def sentence_bytes(sentence):
+            return self.speech_bytes(sentence, lang, slow)[0]
+
+        def produce(_):
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sentences)))) as pool:
+                return join_streams(pool.map(sentence_bytes, sentences))
+
+        return self.synthesize(text, lang, slow, produce=produce)
+
+    def print_stats(self):
+        print(f"   ♻️ TTS cache: {self.stats['hits']} hits, {self.stats['misses']} misses")
+
+tts_cache = lazy_default(TTSCache, "The process-wide TTS cache")
+
+def synthesize_speech(text, lang='ko', slow=False, workers=None):
+    """Speech for a script through the shared TTS cache, sentences in parallel"""
+    return tts_cache().synthesize_script(text, lang, slow, workers)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Checks of the narration pipeline: MP3 parsing, the TTS cache and audio artifacts.
+
+MP3 fixtures are built frame by frame here and gTTS is stubbed, so nothing
+touches the network or needs ffmpeg.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import tts_cache
+from audio_artifact import load_artifact, sidecar_path, write_artifact
+from mp3_frames import iter_frames, join_streams, parse_header, stream_duration
+from render_output import atomic_output
+from tts_cache import TTSCache, split_sentences
+
+# MPEG-2 Layer III, 32 kbps, 24 kHz, mono, no CRC: what gTTS returns
+FRAME_HEADER = bytes([0xFF, 0xF3, 0x44, 0xC4])
+FRAME_LENGTH = 96
+FRAME_SECONDS = 576 / 24000
+
+def mp3_stream(frame_count, xing_count=None, id3=False):
+    data = b''
+    if id3:
+        data += b'ID3\x03\x00\x00' + bytes([0, 0, 0, 20]) + b'\x00' * 20
+    if xing_count is not None:
+        # Side info of a mono MPEG-2 frame is 9 bytes; the tag follows it
+        tag = b'Xing' + (1).to_bytes(4, 'big') + xing_count.to_bytes(4, 'big')
+        data += FRAME_HEADER + b'\x00' * 9 + tag + b'\x00' * (FRAME_LENGTH - 4 - 9 - len(tag))
+    return data + (FRAME_HEADER + b'\x55' * (FRAME_LENGTH - 4)) * frame_count
+
+def test_parse_header():
+    frame = parse_header(mp3_stream(1), 0)
+    assert (frame.version, frame.sample_rate, frame.channels, frame.bitrate) == (2, 24000, 1, 32000)
+    assert frame.length == FRAME_LENGTH
+    assert frame.samples == 576
+
+def test_duration_from_frame_headers():
+    assert stream_duration(mp3_stream(250)) == pytest.approx(250 * FRAME_SECONDS)
+    assert stream_duration(mp3_stream(250, id3=True)) == pytest.approx(250 * FRAME_SECONDS)
+
+def test_duration_from_xing_header():
+    # The Xing count wins over the frames actually present
+    assert stream_duration(mp3_stream(10, xing_count=400)) == pytest.approx(400 * FRAME_SECONDS)
+
+@pytest.mark.parametrize('data', [
+    b'',
+    random.Random(0).randbytes(100_000),
+    b'RIFF' + b'\x00' * 40 + random.Random(1).randbytes(100_000),
+    b'\x00' * 1000 + mp3_stream(3) + random.Random(2).randbytes(50_000),
+])
+def test_non_mp3_input_is_rejected(data):
+    with pytest.raises(ValueError):
+        stream_duration(data)
+
+def test_join_streams_drops_info_frames():
+    joined = join_streams([mp3_stream(20, xing_count=20, id3=True), mp3_stream(30, xing_count=30)])
+    assert len(list(iter_frames(joined))) == 50
+    assert b'Xing' not in joined
+    assert stream_duration(joined) == pytest.approx(50 * FRAME_SECONDS)
+
+def test_split_sentences():
+    text = "태초에 하나님이 천지를 창조하시니라.  빛이 있으라!\n그러므로   감사합니다?"
+    assert split_sentences(text) == ["태초에 하나님이 천지를 창조하시니라.", "빛이 있으라!",
+                                     "그러므로 감사합니다?"]
+
+@pytest.fixture
+def stub_gtts(monkeypatch, tmp_path):
+    """Record every synthesized text; each one speaks for len(text) frames"""
+    monkeypatch.setenv('RENDER_SCRATCH_DIR', str(tmp_path / 'scratch'))
+    os.makedirs(tmp_path / 'scratch')
+    calls = []
+
+    def gtts_bytes(text, lang='ko', slow=False, retries=None):
+        calls.append(text)
+        return mp3_stream(len(text))
+
+    monkeypatch.setattr(tts_cache, 'gtts_bytes', gtts_bytes)
+    return calls
+
+def test_tts_cache_reuses_sentences(stub_gtts, tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path / 'tts'))
+    speech = cache.synthesize_script("첫째 문장. 둘째 문장.", workers=2)
+    assert not speech.cached
+    assert speech.duration == pytest.approx(len("첫째 문장.둘째 문장.") * FRAME_SECONDS)
+    assert sorted(stub_gtts) == ["둘째 문장.", "첫째 문장."]
+    speech.release()
+
+    again = cache.synthesize_script("첫째 문장. 둘째 문장.")
+    assert again.cached
+    again.release()
+
+    edited = cache.synthesize_script("첫째 문장. 셋째 문장.")
+    assert stub_gtts[2:] == ["셋째 문장."]
+    edited.release()
+    assert os.listdir(tmp_path / 'scratch') == []
+
+def test_tts_speech_survives_eviction(stub_gtts, tmp_path):
+    cache = TTSCache(cache_dir=str(tmp_path / 'tts'))
+    speech = cache.synthesize("한 문장")
+    for name in os.listdir(tmp_path / 'tts'):
+        os.unlink(tmp_path / 'tts' / name)
+    assert stream_duration(open(speech.path, 'rb').read()) == pytest.approx(speech.duration)
+    speech.release()
+    assert not os.path.exists(speech.path)
+
+def test_tts_cache_disabled_or_over_budget_stores_nothing(stub_gtts, tmp_path):
+    for max_bytes in (0, 10):
+        cache = TTSCache(cache_dir=str(tmp_path / 'tts'), max_bytes=max_bytes)
+        speech = cache.synthesize_script("가. 나.")
+        speech.release()
+        assert not os.path.exists(tmp_path / 'tts') or os.listdir(tmp_path / 'tts') == []
+    assert os.listdir(tmp_path / 'scratch') == []
+
+def test_tts_cache_evicts_least_recently_used(stub_gtts, tmp_path):
+    entry_bytes = FRAME_LENGTH * len("가나다")
+    cache = TTSCache(cache_dir=str(tmp_path / 'tts'), max_bytes=2 * entry_bytes)
+    for text in ("가나다", "라마바", "사아자"):
+        cache.synthesize(text).release()
+    stored = sorted(name for name in os.listdir(tmp_path / 'tts') if name.endswith('.mp3'))
+    assert stored == sorted(f"{cache.key(text, 'ko', False)}.mp3" for text in ("라마바", "사아자"))
+
+def test_audio_artifact_round_trip(tmp_path):
+    source = tmp_path / 'speech.mp3'
+    source.write_bytes(mp3_stream(100))
+
+    class Speech:
+        path = str(source)
+        duration = 100 * FRAME_SECONDS
+
+    audio_file = str(tmp_path / 'out' / 'audio.mp3')
+    artifact = write_artifact(Speech, audio_file, language='ko')
+    assert artifact.sample_rate == 24000
+    assert sorted(os.listdir(tmp_path / 'out')) == ['audio.mp3', 'audio.mp3.json']
+
+    loaded = load_artifact(audio_file)
+    assert (loaded.duration, loaded.sha256) == (artifact.duration, artifact.sha256)
+
+    with open(audio_file, 'ab') as f:
+        f.write(b'\x00')
+    assert load_artifact(audio_file) is None
+    os.unlink(sidecar_path(audio_file))
+    assert load_artifact(audio_file) is None
+
+def test_atomic_output(tmp_path):
+    output_file = tmp_path / 'video.mp4'
+    output_file.write_bytes(b'old')
+    with pytest.raises(RuntimeError):
+        with atomic_output(str(output_file)) as temp_path:
+            assert temp_path.endswith('.mp4')
+            with open(temp_path, 'wb') as f:
+                f.write(b'partial')
+            raise RuntimeError("encoder failed")
+    assert output_file.read_bytes() == b'old'
+    assert os.listdir(tmp_path) == ['video.mp4']
+
+    with atomic_output(str(output_file)) as temp_path:
+        with open(temp_path, 'wb') as f:
+            f.write(b'new')
+    assert output_file.read_bytes() == b'new'
+    assert os.listdir(tmp_path) == ['video.mp4']
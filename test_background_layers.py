@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Checks of background loop caching and keyframe interpolation."""
+import gc
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from background_cache import BackgroundCache
+from keyframes import KeyframeBackground
+from theme_layers import InPlaceBackground
+
+SIZE = (48, 32)
+
+def theme(colour):
+    def render_frame(img, t):
+        img[:] = colour
+        img[:, int(t * 10) % SIZE[0]] = 255
+    return InPlaceBackground(render_frame, SIZE).make_frame
+
+def test_short_video_does_not_store_the_loop(tmp_path):
+    cache = BackgroundCache(cache_dir=str(tmp_path))
+    clip = cache.clip('probe', theme((1, 2, 3)), 1.0, SIZE, 10, period=4.8)
+    for frame_num in range(10):
+        clip.get_frame(frame_num / 10)
+    del clip
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+
+def test_loop_is_stored_and_served_again(tmp_path):
+    cache = BackgroundCache(cache_dir=str(tmp_path))
+    clip = cache.clip('probe', theme((1, 2, 3)), 10.0, SIZE, 10, period=4.8)
+    rendered = [clip.get_frame(frame_num / 10).copy() for frame_num in range(100)]
+    assert sorted(name.rsplit('.', 1)[1] for name in os.listdir(tmp_path)) == ['json', 'rgb']
+
+    cached = cache.clip('probe', theme((1, 2, 3)), 10.0, SIZE, 10, period=4.8)
+    for frame_num in range(100):
+        assert (cached.get_frame(frame_num / 10) == rendered[frame_num]).all()
+
+def test_long_periods_are_rendered_directly_unless_cut_loops(tmp_path):
+    cache = BackgroundCache(cache_dir=str(tmp_path), max_loop_seconds=2)
+    assert cache.loop_frames(10, 4.8) is None
+    clip = cache.clip('probe', theme((1, 2, 3)), 5.0, SIZE, 10, period=4.8)
+    for frame_num in range(50):
+        clip.get_frame(frame_num / 10)
+    assert os.listdir(tmp_path) == []
+
+    cut = BackgroundCache(cache_dir=str(tmp_path), max_loop_seconds=2, cut_loops=True)
+    assert cut.loop_frames(10, 4.8) == (20, 10)
+
+def test_changed_colours_are_not_served_stale(tmp_path):
+    cache = BackgroundCache(cache_dir=str(tmp_path))
+    clip = cache.clip('probe', theme((1, 2, 3)), 4.8, SIZE, 10, period=4.8)
+    for frame_num in range(48):
+        clip.get_frame(frame_num / 10)
+
+    edited = cache.clip('probe', theme((9, 2, 3)), 4.8, SIZE, 10, period=4.8)
+    assert (edited.get_frame(0.5)[:, 0] == (9, 2, 3)).all()
+
+class CountingLayer:
+    def make_frame(self, t):
+        return np.full((SIZE[1], SIZE[0], 3), int(round(t * 10)) * 10, dtype=np.uint8)
+
+def test_keyframe_pair_survives_backward_seek():
+    background = KeyframeBackground(CountingLayer(), 10, size=SIZE)
+    out = np.empty((SIZE[1], SIZE[0], 3), dtype=np.uint8)
+    background._keyframe(0)
+    background._keyframe(2)
+    background._render_blended(out, 0.05)  # halfway between keyframes 0 and 1
+    assert (out == 5).all()
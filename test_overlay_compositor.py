@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Parity of the overlay compositor and alpha kernels with moviepy's CompositeVideoClip."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from moviepy.editor import CompositeVideoClip, VideoClip
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from alpha_blend import blend_premultiplied, blend_solid
+from overlay_cache import OverlayRaster, premultiply
+from overlay_compositor import RasterClip, composite_overlays
+
+SIZE = (160, 240)
+DURATION = 3.0
+
+def overlay_rgba(width, height, colour, seed):
+    """Straight RGBA with an opaque core and a soft, antialiased edge"""
+    rng = np.random.RandomState(seed)
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    rgba[:, :, :3] = colour
+    ys, xs = np.mgrid[0:height, 0:width]
+    distance = np.hypot((xs - width / 2) / (width / 2), (ys - height / 2) / (height / 2))
+    rgba[:, :, 3] = np.clip((1.1 - distance) * 400, 0, 255).astype(np.uint8)
+    rgba[:, :, :3] = np.clip(rgba[:, :, :3].astype(int) + rng.randint(-20, 20, (height, width, 3)), 0, 255)
+    return rgba
+
+def background():
+    ys, xs = np.mgrid[0:SIZE[1], 0:SIZE[0]]
+
+    def make_frame(t):
+        frame = np.empty((SIZE[1], SIZE[0], 3), dtype=np.uint8)
+        frame[:, :, 0] = (xs + int(t * 40)) % 256
+        frame[:, :, 1] = ys % 256
+        frame[:, :, 2] = 90
+        return frame
+
+    return VideoClip(make_frame, duration=DURATION)
+
+def clips():
+    title = RasterClip(OverlayRaster.from_straight(overlay_rgba(120, 40, (255, 215, 0), 1)))
+    verse = RasterClip(OverlayRaster.from_straight(overlay_rgba(100, 60, (230, 240, 255), 2)))
+    brand = RasterClip(OverlayRaster.from_straight(overlay_rgba(80, 20, (255, 255, 255), 3)))
+    return [
+        background(),
+        title.set_position(('center', 20)).set_duration(DURATION),
+        verse.set_position(('center', 40)).set_duration(DURATION - 0.6).crossfadein(0.8).set_start(0.6),
+        brand.set_position((-10, 225)).set_duration(DURATION).crossfadein(1.0),
+    ]
+
+@pytest.mark.parametrize('t', [0.0, 0.3, 0.6, 0.65, 1.0, 1.45, 2.0, 2.9])
+def test_compositor_matches_composite_video_clip(t):
+    expected = CompositeVideoClip(clips()).get_frame(t).astype(np.int16)
+    actual = composite_overlays(clips()).get_frame(t).astype(np.int16)
+    # 8-bit premultiplied layers round once each; title and verse overlap
+    assert np.abs(actual - expected).max() <= 3
+    assert np.count_nonzero(np.abs(actual - expected) > 1) < 0.01 * actual.size
+
+def test_blend_premultiplied_matches_float_reference():
+    rng = np.random.RandomState(0)
+    dst = rng.randint(0, 256, (30, 40, 3)).astype(np.uint8)
+    source = premultiply(rng.randint(0, 256, (20, 25, 4)).astype(np.uint8))
+    x, y, opacity = 20, -5, 0.6
+
+    alpha = source[:, :, 3:4] / 255.0 * opacity
+    expected = dst.astype(np.float64)
+    region = expected[0:15, 20:40]
+    visible = source[5:20, 0:20]
+    region[:] = region * (1 - alpha[5:20, 0:20]) + visible[:, :, :3] * opacity
+
+    actual = blend_premultiplied(dst.copy(), source, x, y, opacity)
+    assert np.abs(actual.astype(np.float64) - expected).max() <= 1.5
+
+def test_blend_solid_matches_float_reference():
+    dst = np.arange(0, 256, dtype=np.uint8).reshape(16, 16, 1).repeat(3, axis=2)
+    expected = dst * 0.7 + np.array([200, 200, 255]) * 0.3
+    actual = blend_solid(dst.copy(), (200, 200, 255), 0.3)
+    assert np.abs(actual - expected).max() <= 1
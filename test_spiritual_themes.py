@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Parity of the vectorized spiritual theme kernels with the original per-pixel loops."""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from generate_spiritual_video import make_spiritual_frame_function
+
+SIZE = (120, 160)
+
+def baseline_frame(theme, t, size=SIZE):
+    """The make_frame(t) kernels as create_spiritual_background first shipped them"""
+    if theme == "golden_light":
+        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        for y in range(size[1]):
+            intensity = int(255 * (0.3 + 0.4 * np.sin(y / size[1] * np.pi)))
+            img[y, :] = [intensity, int(intensity * 0.8), int(intensity * 0.3)]
+        return np.roll(img, int(30 * np.sin(t * 0.5)), axis=0)
+
+    if theme == "peaceful_blue":
+        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        for y in range(size[1]):
+            for x in range(size[0]):
+                wave1 = np.sin((x + t * 50) / 100) * 0.3
+                wave2 = np.cos((y + t * 30) / 150) * 0.2
+                img[y, x] = [20, 50, int(100 + 80 * (wave1 + wave2))]
+        return img
+
+    if theme == "sunset_worship":
+        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        for y in range(size[1]):
+            ratio = y / size[1]
+            img[y, :] = [int(255 * (1 - ratio * 0.7)), int(150 * (1 - ratio)), int(100 + 155 * ratio)]
+        return np.roll(img, int(10 * np.sin(t * 0.3)), axis=1)
+
+    img = np.full((size[1], size[0], 3), [40, 60, 100], dtype=np.uint8)
+    center_x, center_y = size[0] // 2, size[1] // 2
+    cross_width = 80
+    cross_alpha = 0.3 + 0.2 * np.sin(t * 0.5)
+    x1, x2 = center_x - cross_width // 2, center_x + cross_width // 2
+    img[:, x1:x2] = img[:, x1:x2] * (1 - cross_alpha) + np.array([200, 200, 255]) * cross_alpha
+    y1, y2 = center_y - cross_width // 2, center_y + cross_width // 2
+    img[y1:y2, :] = img[y1:y2, :] * (1 - cross_alpha) + np.array([200, 200, 255]) * cross_alpha
+    return img.astype(np.uint8)
+
+@pytest.mark.parametrize('theme', ["golden_light", "peaceful_blue", "sunset_worship", "cross_pattern"])
+def test_theme_matches_baseline_kernel(theme):
+    make_frame = make_spiritual_frame_function(theme, SIZE)
+    for t in (0.0, 0.4, 1.7, 3.1, 6.0, 11.3):
+        expected = baseline_frame(theme, t).astype(np.int16)
+        actual = np.asarray(make_frame(t)).astype(np.int16)
+        assert actual.shape == expected.shape
+        assert np.abs(actual - expected).max() <= 1, f"{theme} at t={t}"
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Checks of the Pillow text rasterizer's font handling and blank labels."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import text_raster
+from text_raster import check_fonts, text_clip
+
+@pytest.fixture
+def no_fonts(monkeypatch):
+    monkeypatch.delenv('TEXT_FONT', raising=False)
+    monkeypatch.delenv('TEXT_FONT_BOLD', raising=False)
+    monkeypatch.setattr(text_raster, 'FONT_CANDIDATES', {'regular': [], 'bold': []})
+    text_raster.load_font.cache_clear()
+    yield
+    text_raster.load_font.cache_clear()
+
+def test_missing_font_fails_at_startup_naming_the_variable(no_fonts):
+    with pytest.raises(OSError, match='TEXT_FONT'):
+        check_fonts()
+
+def test_missing_bold_font_names_its_variable(no_fonts, monkeypatch, tmp_path):
+    monkeypatch.setenv('TEXT_FONT', str(tmp_path / 'unused.ttf'))
+    with pytest.raises(OSError, match='TEXT_FONT'):
+        check_fonts(['Arial'])
+    with pytest.raises(OSError, match='TEXT_FONT_BOLD'):
+        check_fonts(['Arial-Bold'])
+
+@pytest.mark.parametrize('txt', ['', '   ', '\n'])
+def test_blank_text_has_no_overlay(no_fonts, txt):
+    assert text_clip(txt, fontsize=40, color='white', stroke_color='black', stroke_width=2) is None